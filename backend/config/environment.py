@@ -1,6 +1,7 @@
 # config/environment.py
 import os
-from typing import Optional
+from functools import lru_cache
+from typing import List, Optional
 from enum import Enum
 
 class Environment(str, Enum):
@@ -8,43 +9,62 @@ class Environment(str, Enum):
     STAGING = "staging" 
     PRODUCTION = "production"
 
+_TRUE = frozenset({"true", "1", "yes", "on"})
+
+def parse_bool(value: str) -> bool:
+    return value.lower() in _TRUE
+
+def parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def _passthrough(value):
+    return value
+
+# (attribute, environment variable, default, caster) - every setting is parsed by this one table
+ENV_SCHEMA = (
+    ("environment", "ENVIRONMENT", "development", Environment),
+    ("debug", "DEBUG", "true", parse_bool),
+    ("log_level", "LOG_LEVEL", "INFO", _passthrough),
+
+    # Database settings
+    ("db_pool_size", "DB_POOL_SIZE", "5", int),
+    ("db_max_overflow", "DB_MAX_OVERFLOW", "10", int),
+
+    # Server settings
+    ("host", "HOST", "0.0.0.0", _passthrough),
+    ("port", "PORT", "8000", int),
+    ("workers", "WORKERS", "1", int),
+
+    # Security settings
+    ("secret_key", "SECRET_KEY", "your-secret-key-change-in-production", _passthrough),
+    ("cors_origins", "CORS_ORIGINS", "http://localhost:5173,http://localhost:3000,http://localhost:8080", parse_list),
+    ("rate_limit_calls", "RATE_LIMIT_CALLS", "100", int),
+    ("rate_limit_period", "RATE_LIMIT_PERIOD", "60", int),
+
+    # ML Model settings
+    ("model_cache_dir", "MODEL_CACHE_DIR", "./model_cache", _passthrough),
+    ("gpu_memory_fraction", "GPU_MEMORY_FRACTION", "0.85", float),
+    ("model_load_timeout", "MODEL_LOAD_TIMEOUT", "300", int),
+    ("prefer_best_checkpoint", "PREFER_BEST_CHECKPOINT", "true", parse_bool),
+
+    # External API settings
+    ("external_llm_api_key", "EXTERNAL_LLM_API_KEY", None, _passthrough),
+    ("fallback_to_external", "FALLBACK_TO_EXTERNAL", "false", parse_bool),
+
+    # Monitoring and observability
+    ("enable_metrics", "ENABLE_METRICS", "true", parse_bool),
+    ("metrics_port", "METRICS_PORT", "9090", int),
+    ("enable_tracing", "ENABLE_TRACING", "false", parse_bool),
+)
+
 class EnvironmentConfig:
     """Environment-specific configuration management"""
     
     def __init__(self):
-        self.environment = Environment(os.getenv("ENVIRONMENT", "development"))
-        self.debug = os.getenv("DEBUG", "true").lower() == "true"
-        self.log_level = os.getenv("LOG_LEVEL", "INFO")
-        
-        # Database settings
-        self.db_pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
-        self.db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
-        
-        # Server settings
-        self.host = os.getenv("HOST", "0.0.0.0")
-        self.port = int(os.getenv("PORT", "8000"))
-        self.workers = int(os.getenv("WORKERS", "1"))
-        
-        # Security settings
-        self.secret_key = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
-        self.cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
-        self.rate_limit_calls = int(os.getenv("RATE_LIMIT_CALLS", "100"))
-        self.rate_limit_period = int(os.getenv("RATE_LIMIT_PERIOD", "60"))
-        
-        # ML Model settings
-        self.model_cache_dir = os.getenv("MODEL_CACHE_DIR", "./model_cache")
-        self.gpu_memory_fraction = float(os.getenv("GPU_MEMORY_FRACTION", "0.85"))
-        self.model_load_timeout = int(os.getenv("MODEL_LOAD_TIMEOUT", "300"))
-        self.prefer_best_checkpoint = os.getenv("PREFER_BEST_CHECKPOINT", "true").lower() == "true"
-        
-        # External API settings
-        self.external_llm_api_key = os.getenv("EXTERNAL_LLM_API_KEY")
-        self.fallback_to_external = os.getenv("FALLBACK_TO_EXTERNAL", "false").lower() == "true"
-        
-        # Monitoring and observability
-        self.enable_metrics = os.getenv("ENABLE_METRICS", "true").lower() == "true"
-        self.metrics_port = int(os.getenv("METRICS_PORT", "9090"))
-        self.enable_tracing = os.getenv("ENABLE_TRACING", "false").lower() == "true"
+        # One lookup of the environment mapping; every setting below reads from it
+        env = os.environ.get
+        for attr, key, default, cast in ENV_SCHEMA:
+            setattr(self, attr, cast(env(key, default)))
         
     @property
     def is_development(self) -> bool:
@@ -56,19 +76,29 @@ class EnvironmentConfig:
     
     def get_cors_config(self) -> dict:
         """Get CORS configuration based on environment"""
+        # Explicit origins in every environment: a "*" with credentials makes Starlette
+        # echo each request's Origin instead of matching a fixed set.
+        # max_age lets browsers reuse a preflight for a day instead of re-sending OPTIONS.
         if self.is_production:
             return {
                 "allow_origins": self.cors_origins,
                 "allow_credentials": True,
                 "allow_methods": ["GET", "POST", "PUT", "DELETE"],
                 "allow_headers": ["*"],
+                "max_age": 86400,
             }
         else:
             return {
-                "allow_origins": ["*"],
+                "allow_origins": self.cors_origins,
                 "allow_credentials": True,
                 "allow_methods": ["*"],
                 "allow_headers": ["*"],
+                "max_age": 86400,
             }
 
-env_config = EnvironmentConfig()
+@lru_cache(maxsize=1)
+def get_env_config() -> EnvironmentConfig:
+    """The process-wide EnvironmentConfig, parsed once"""
+    return EnvironmentConfig()
+
+env_config = get_env_config()
@@ -1,11 +1,13 @@
 # config/settings.py
 import os
-from typing import Set
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Final, List, Set
 import secrets
-from .environment import EnvironmentConfig
+from .environment import get_env_config, parse_bool
 
 # Initialize environment config
-env_config = EnvironmentConfig()
+env_config = get_env_config()
 
 class AppConfig:
     """A class to hold all configuration variables in one place."""
@@ -16,9 +18,14 @@ class AppConfig:
     # Organized model directory structure
     MODELS_BASE_DIR: str = "./models"
     KNOWLEDGE_BASE_PATH: str = './models/knowledge_base/knowledge_base_with_embeddings.pt'
+    KNOWLEDGE_BASE_NPY_PATH: str = './models/knowledge_base/kb_embeddings.npy'  # Memory-mapped FP16 export, preferred when present
+    KNOWLEDGE_BASE_CHUNKS_PATH: str = './models/knowledge_base/kb_chunks.json'
     FINETUNED_OUTPUT_DIR: str = "./models/checkpoints/sailor2-1b-vangvieng-finetuned"
+    AWQ_MODEL_DIR: str = "./models/checkpoints/sailor2-1b-vangvieng-awq"  # Merged + AWQ INT4, preferred when present
     BASE_LLM_MODEL: str = "sail/Sailor2-L-1B-Chat"
     RETRIEVER_MODEL: str = 'sentence-transformers/LaBSE'
+    RETRIEVER_BACKEND: str = os.getenv('RETRIEVER_BACKEND', 'torch')  # 'torch' (same device as LLM) or 'onnx' (INT8 on CPU)
+    RETRIEVER_ONNX_FILE: str = 'onnx/model_qint8_avx512_vnni.onnx'
     
     # Model checkpoint preferences
     PREFER_BEST_CHECKPOINT: bool = env_config.prefer_best_checkpoint  # Use best-checkpoint over latest numbered checkpoint
@@ -35,14 +42,28 @@ class AppConfig:
     CONFIRMATION_KEYWORDS: Set[str] = {"yes", "ok", "y", "ແມ່ນ", "ຕົກລົງ", "confirm", "ແມ່ນແລ້ວ"}
     PRICE_INQUIRY_KEYWORDS: Set[str] = {"ລາຄາ", "price", "cost", "ເທົ່າໃດ", "how much", "ຄ່າຫ້ອງ", "ຄ່າໃຊ້ຈ່າຍ"}
     BOOKING_SIMILARITY_THRESHOLD: float = 0.65
+    BOOKING_MIN_TOKENS: int = 3
+    MAX_CONVERSATION_SESSIONS: int = 10_000  # Booking-flow states kept in memory, least recently used evicted first
     RAG_TOP_K: int = 2  # Reduced from 3 to save memory
     RAG_CONFIDENCE_THRESHOLD: float = 0.4
+    RAG_HNSW_M: int = 32  # Graph degree of the FAISS HNSW index (used when faiss is installed)
     LLM_TIMEOUT_SECONDS: int = 180  # Reduced timeout for mobile GPU
 
     # --- MOBILE GPU OPTIMIZATIONS ---
     MAX_INPUT_LENGTH: int = 512  # Reduced from 1024
     MAX_NEW_TOKENS: int = 2048    # Reduced from 256
-    BATCH_SIZE: int = 1          # Single batch processing
+    CONTEXT_MAX_TOKENS: int = 160  # RAG context budget inside MAX_INPUT_LENGTH
+    QUERY_MAX_TOKENS: int = 64  # Retriever queries are padded to this fixed length on GPU
+    TEMPERATURE: float = 0.7
+    TOP_P: float = 0.9
+    REPETITION_PENALTY: float = 1.1
+    STOP_STRINGS: List[str] = ["Human:", "System:"]  # Stop as soon as the model starts writing the next turn
+    BATCH_SIZE: int = 4          # Max concurrent /ask/ prompts batched into one generate() call
+    BATCH_WAIT_MS: int = 20      # How long the generation queue waits to fill a batch
+    RETRIEVAL_BATCH_SIZE: int = 16  # Max concurrent RAG lookups encoded in one retriever pass
+    RETRIEVAL_BATCH_WAIT_MS: int = 10
+    TORCH_COMPILE_ENABLED: bool = True  # Capture the decode step as a CUDA graph
+    MERGE_LORA_ON_LOAD: bool = True  # Merge LoRA into the bnb 4-bit base instead of running adapters per token
     
     # --- Performance Settings ---
     CACHE_TTL_DEFAULT: int = 3600  # 1 hour
@@ -55,7 +76,7 @@ class AppConfig:
     RATE_LIMIT_PERIOD: int = 60  # seconds
     
     # --- Email Configuration ---
-    EMAIL_ENABLED: bool = os.getenv('EMAIL_ENABLED', 'false').lower() == 'true'
+    EMAIL_ENABLED: bool = parse_bool(os.getenv('EMAIL_ENABLED', 'false'))
     SMTP_SERVER: str = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT: int = int(os.getenv('SMTP_PORT', '587'))
     SMTP_USERNAME: str = os.getenv('SMTP_USERNAME', '')
@@ -63,57 +84,112 @@ class AppConfig:
     FROM_EMAIL: str = os.getenv('FROM_EMAIL', 'noreply@hotel.com')
     FROM_NAME: str = os.getenv('FROM_NAME', 'Vang Vieng Hotel')
 
+# The configs below are read-only after startup, so they are frozen slotted dataclasses built
+# once from the environment. AppConfig stays a plain class: /config/ routes update it at runtime.
+@dataclass(frozen=True, slots=True)
 class AuthConfig:
-    SECRET_KEY = os.getenv('SECRET_KEY', secrets.token_urlsafe(32))
-    ALGORITHM = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', '30'))
+    SECRET_KEY: str = field(repr=False)
+    ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # Security settings
-    PASSWORD_MIN_LENGTH = 8
-    MAX_LOGIN_ATTEMPTS = 5
-    LOCKOUT_DURATION = 900  # 15 minutes
+    PASSWORD_MIN_LENGTH: int = 8
+    MAX_LOGIN_ATTEMPTS: int = 5
+    LOCKOUT_DURATION: int = 900  # 15 minutes
 
+    @classmethod
+    def from_env(cls) -> "AuthConfig":
+        env = os.environ.get
+        return cls(
+            SECRET_KEY=env('SECRET_KEY') or secrets.token_urlsafe(32),
+            ACCESS_TOKEN_EXPIRE_MINUTES=int(env('ACCESS_TOKEN_EXPIRE_MINUTES', '30'))
+        )
+
+@dataclass(frozen=True, slots=True)
 class DatabaseConfig:
     """Database configuration settings"""
-    DB_FILE = os.getenv('DATABASE_URL', './hotel_management.db')
-    DB_TIMEOUT = 30
-    DB_CHECK_SAME_THREAD = False
+    DB_FILE: str = './hotel_management.db'
+    TELEMETRY_DB_FILE: str = './hotel_telemetry.db'  # Chat history, analytics events and system logs
+    DB_TIMEOUT: int = 30
+    DB_CHECK_SAME_THREAD: bool = False
+    APSW_WRITER_ENABLED: bool = False  # Flush buffered chat/analytics rows through apsw when installed
     
     # Backup settings
-    BACKUP_ENABLED = os.getenv('BACKUP_ENABLED', 'true').lower() == 'true'
-    BACKUP_INTERVAL_HOURS = int(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
-    BACKUP_RETENTION_DAYS = int(os.getenv('BACKUP_RETENTION_DAYS', '30'))
+    BACKUP_ENABLED: bool = True
+    BACKUP_INTERVAL_HOURS: int = 24
+    BACKUP_RETENTION_DAYS: int = 30
+
+    @classmethod
+    def from_env(cls) -> "DatabaseConfig":
+        env = os.environ.get
+        return cls(
+            DB_FILE=env('DATABASE_URL', './hotel_management.db'),
+            TELEMETRY_DB_FILE=env('TELEMETRY_DATABASE_URL', './hotel_telemetry.db'),
+            APSW_WRITER_ENABLED=parse_bool(env('DB_APSW_WRITER', 'false')),
+            BACKUP_ENABLED=parse_bool(env('BACKUP_ENABLED', 'true')),
+            BACKUP_INTERVAL_HOURS=int(env('BACKUP_INTERVAL_HOURS', '24')),
+            BACKUP_RETENTION_DAYS=int(env('BACKUP_RETENTION_DAYS', '30'))
+        )
 
+@dataclass(frozen=True, slots=True)
 class LoggingConfig:
     """Logging configuration"""
-    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
-    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' or 'text'
-    LOG_FILE_ENABLED = os.getenv('LOG_FILE_ENABLED', 'true').lower() == 'true'
-    LOG_FILE_PATH = os.getenv('LOG_FILE_PATH', 'logs/hotel_app.log')
-    LOG_ROTATION_SIZE = os.getenv('LOG_ROTATION_SIZE', '10MB')
-    LOG_RETENTION_COUNT = int(os.getenv('LOG_RETENTION_COUNT', '5'))
+    LOG_LEVEL: str = 'INFO'
+    LOG_FORMAT: str = 'json'  # 'json' or 'text'
+    LOG_FILE_ENABLED: bool = True
+    LOG_FILE_PATH: str = 'logs/hotel_app.log'
+    LOG_ROTATION_SIZE: str = '10MB'
+    LOG_RETENTION_COUNT: int = 5
 
+    @classmethod
+    def from_env(cls) -> "LoggingConfig":
+        env = os.environ.get
+        return cls(
+            LOG_LEVEL=env('LOG_LEVEL', 'INFO'),
+            LOG_FORMAT=env('LOG_FORMAT', 'json'),
+            LOG_FILE_ENABLED=parse_bool(env('LOG_FILE_ENABLED', 'true')),
+            LOG_FILE_PATH=env('LOG_FILE_PATH', 'logs/hotel_app.log'),
+            LOG_ROTATION_SIZE=env('LOG_ROTATION_SIZE', '10MB'),
+            LOG_RETENTION_COUNT=int(env('LOG_RETENTION_COUNT', '5'))
+        )
+
+@dataclass(frozen=True, slots=True)
 class MonitoringConfig:
     """Monitoring and analytics configuration"""
-    ANALYTICS_ENABLED = os.getenv('ANALYTICS_ENABLED', 'true').lower() == 'true'
-    PERFORMANCE_MONITORING = os.getenv('PERFORMANCE_MONITORING', 'true').lower() == 'true'
-    ERROR_TRACKING = os.getenv('ERROR_TRACKING', 'true').lower() == 'true'
+    ANALYTICS_ENABLED: bool = True
+    PERFORMANCE_MONITORING: bool = True
+    ERROR_TRACKING: bool = True
     
     # Alert thresholds
-    HIGH_RESPONSE_TIME_MS = int(os.getenv('HIGH_RESPONSE_TIME_MS', '10000'))  # Reduced from 5000 to 10000 for mobile GPU
-    HIGH_ERROR_COUNT = int(os.getenv('HIGH_ERROR_COUNT', '10'))
-    HIGH_OCCUPANCY_RATE = float(os.getenv('HIGH_OCCUPANCY_RATE', '95.0'))
-    LOW_CACHE_HIT_RATE = float(os.getenv('LOW_CACHE_HIT_RATE', '50.0'))
+    HIGH_RESPONSE_TIME_MS: int = 10000  # Reduced from 5000 to 10000 for mobile GPU
+    HIGH_ERROR_COUNT: int = 10
+    HIGH_OCCUPANCY_RATE: float = 95.0
+    LOW_CACHE_HIT_RATE: float = 50.0
+
+    @classmethod
+    def from_env(cls) -> "MonitoringConfig":
+        env = os.environ.get
+        return cls(
+            ANALYTICS_ENABLED=parse_bool(env('ANALYTICS_ENABLED', 'true')),
+            PERFORMANCE_MONITORING=parse_bool(env('PERFORMANCE_MONITORING', 'true')),
+            ERROR_TRACKING=parse_bool(env('ERROR_TRACKING', 'true')),
+            HIGH_RESPONSE_TIME_MS=int(env('HIGH_RESPONSE_TIME_MS', '10000')),
+            HIGH_ERROR_COUNT=int(env('HIGH_ERROR_COUNT', '10')),
+            HIGH_OCCUPANCY_RATE=float(env('HIGH_OCCUPANCY_RATE', '95.0')),
+            LOW_CACHE_HIT_RATE=float(env('LOW_CACHE_HIT_RATE', '50.0'))
+        )
 
 # --- Predefined Room Numbers (for DB initialization) ---
-ROOM_NUMBERS = [
+ROOM_NUMBERS: Final = (
     "101", "102", "103", "104", "201", "202", "203", "204", "205", "206", "207",
     "301", "302", "303", "304", "305", "306", "307", "401", "402", "403", "404",
     "405", "406", "407"
-]
+)
+# O(1) membership checks; ROOM_NUMBERS keeps the ordered sequence for seeding
+ROOM_NUMBER_SET: Final = frozenset(ROOM_NUMBERS)
 
-# Hotel Information
-HOTEL_INFO = {
+# Hotel Information (read-only; dict(HOTEL_INFO) for a JSON-serializable copy)
+HOTEL_INFO = MappingProxyType({
     'name': os.getenv('HOTEL_NAME', 'Vang Vieng Hotel'),
     'address': os.getenv('HOTEL_ADDRESS', 'Vang Vieng, Laos'),
     'phone': os.getenv('HOTEL_PHONE', '+856 20 12345678'),
@@ -123,10 +199,10 @@ HOTEL_INFO = {
     'currency': os.getenv('HOTEL_CURRENCY', 'LAK'),
     'check_in_time': os.getenv('CHECK_IN_TIME', '14:00'),
     'check_out_time': os.getenv('CHECK_OUT_TIME', '12:00')
-}
+})
 
 CONFIG = AppConfig()
-AUTH_CONFIG = AuthConfig()
-DB_CONFIG = DatabaseConfig()
-LOG_CONFIG = LoggingConfig()
-MONITOR_CONFIG = MonitoringConfig()
+AUTH_CONFIG = AuthConfig.from_env()
+DB_CONFIG = DatabaseConfig.from_env()
+LOG_CONFIG = LoggingConfig.from_env()
+MONITOR_CONFIG = MonitoringConfig.from_env()
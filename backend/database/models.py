@@ -1,180 +1,406 @@
 # database/models.py
+import re
+import json
 import sqlite3
-from typing import Optional, List, Dict, Any
-from datetime import datetime
-from config.settings import CONFIG
+import threading
+from collections import deque
+from typing import Any, Dict, Final, List, Optional
+from datetime import datetime, timedelta, timezone
+from config.settings import CONFIG, DB_CONFIG
+from services.cache import InMemoryCache
 import logging
 
+try:
+    import apsw
+except ImportError:
+    apsw = None
+
 logger = logging.getLogger(__name__)
 
+_dumps = json.dumps
+
+# Booking/user tables in the main database, created in one executescript parse and a single transaction
+_SCHEMA_SQL = """
+BEGIN;
+
+-- Users table with enhanced authentication
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    email TEXT UNIQUE,
+    full_name TEXT,
+    role TEXT DEFAULT 'user',
+    is_active BOOLEAN DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP,
+    api_key_hash TEXT,
+    phone TEXT,
+    preferences TEXT  -- JSON string for user preferences
+);
+
+-- Enhanced rooms table
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_number TEXT UNIQUE NOT NULL,
+    room_type TEXT DEFAULT 'standard',
+    floor INTEGER,
+    max_occupancy INTEGER DEFAULT 2,
+    price_per_night REAL DEFAULT 0.0,
+    amenities TEXT,  -- JSON string
+    status TEXT DEFAULT 'available',
+    last_cleaned TIMESTAMP,
+    maintenance_notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Enhanced bookings table
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_reference TEXT UNIQUE NOT NULL,
+    room_id INTEGER NOT NULL,
+    guest_name TEXT NOT NULL,
+    guest_email TEXT,
+    guest_phone TEXT,
+    check_in_date DATE NOT NULL,
+    check_out_date DATE NOT NULL,
+    total_amount REAL DEFAULT 0.0,
+    status TEXT DEFAULT 'confirmed',
+    special_requests TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_by_user_id INTEGER,
+    FOREIGN KEY (room_id) REFERENCES rooms (id),
+    FOREIGN KEY (created_by_user_id) REFERENCES users (id)
+);
+
+-- Hotel configuration table
+CREATE TABLE IF NOT EXISTS hotel_config (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config_key TEXT UNIQUE NOT NULL,
+    config_value TEXT NOT NULL,
+    config_type TEXT DEFAULT 'string',
+    description TEXT,
+    updated_by_user_id INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (updated_by_user_id) REFERENCES users (id)
+);
+
+-- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_bookings_dates ON bookings(check_in_date, check_out_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_created_at ON bookings(created_at);
+CREATE INDEX IF NOT EXISTS idx_bookings_room_status_dates ON bookings(room_id, status, check_in_date, check_out_date);
+CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+
+COMMIT;
+"""
+
+# Append-only chat/analytics/log tables live in their own file, attached to every
+# connection as "telemetry", so their WAL fsyncs and checkpoints never stall booking reads.
+# (Foreign keys cannot cross databases, so user_id is not declared as one here.)
+_TELEMETRY_SCHEMA_SQL = """
+BEGIN;
+
+-- Enhanced chat history
+CREATE TABLE IF NOT EXISTS telemetry.chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    bot_response TEXT NOT NULL,
+    response_source TEXT DEFAULT 'unknown',
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER,
+    sentiment_score REAL,
+    intent_classification TEXT,
+    response_time_ms INTEGER
+);
+
+-- System logs table
+CREATE TABLE IF NOT EXISTS telemetry.system_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    log_level TEXT NOT NULL,
+    module TEXT NOT NULL,
+    message TEXT NOT NULL,
+    user_id INTEGER,
+    ip_address TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    additional_data TEXT  -- JSON string
+);
+
+-- Analytics events table
+CREATE TABLE IF NOT EXISTS telemetry.analytics_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_type TEXT NOT NULL,
+    event_data TEXT NOT NULL,  -- JSON string
+    user_id INTEGER,
+    session_id TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS telemetry.idx_chat_session_ts ON chat_history(session_id, timestamp);
+CREATE INDEX IF NOT EXISTS telemetry.idx_chat_timestamp ON chat_history(timestamp);
+CREATE INDEX IF NOT EXISTS telemetry.idx_analytics_type ON analytics_events(event_type);
+
+COMMIT;
+"""
+
+# Every table and index each script creates, for the already-initialized check
+_SCHEMA_OBJECTS = tuple(re.findall(r'IF NOT EXISTS (\w+)', _SCHEMA_SQL))
+_TELEMETRY_SCHEMA_OBJECTS = tuple(re.findall(r'IF NOT EXISTS telemetry\.(\w+)', _TELEMETRY_SCHEMA_SQL))
+
+# All DatabaseManager SQL lives here, so every call hands sqlite3 the same string
+# object and hits the connection's statement cache
+_SAVE_CHAT_SQL: Final = """
+    INSERT INTO telemetry.chat_history (session_id, user_message, bot_response,
+                              response_source, user_id, sentiment_score,
+                              intent_classification, response_time_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# The booking reference is generated by SQLite and handed back by RETURNING (SQLite >= 3.35)
+_CREATE_BOOKING_SQL: Final = """
+    INSERT INTO bookings (booking_reference, room_id, guest_name, guest_email,
+                          guest_phone, check_in_date, check_out_date, total_amount,
+                          special_requests, created_by_user_id)
+    VALUES ('BK' || upper(hex(randomblob(4))), ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    RETURNING booking_reference
+"""
+_OCCUPY_ROOM_SQL: Final = "UPDATE rooms SET status = 'occupied', updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+_CREATE_USER_SQL: Final = """
+    INSERT INTO users (username, password_hash, email, full_name, role)
+    VALUES (?, ?, ?, ?, ?)
+"""
+_UPDATE_LAST_LOGIN_SQL: Final = "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?"
+_CREATE_ROOM_SQL: Final = """
+    INSERT INTO rooms (room_number, room_type, floor, max_occupancy,
+                       price_per_night, amenities)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+_AVAILABLE_ROOMS_SQL: Final = """
+    SELECT r.* FROM rooms r
+    LEFT JOIN bookings b
+        ON b.room_id = r.id
+        AND b.status IN ('confirmed', 'checked_in')
+        AND NOT (b.check_out_date <= ? OR b.check_in_date >= ?)
+    WHERE r.status = 'available'
+    AND b.id IS NULL
+"""
+_BOOKING_BY_REFERENCE_SQL: Final = """
+    SELECT b.*, r.room_number, r.room_type
+    FROM bookings b
+    JOIN rooms r ON b.room_id = r.id
+    WHERE b.booking_reference = ?
+"""
+_ANALYTICS_SUMMARY_SQL: Final = """
+    SELECT chat.*, booking.*, room.*
+    FROM
+        -- Chat statistics
+        (SELECT COUNT(*) as total_chats,
+                COUNT(DISTINCT session_id) as unique_sessions,
+                AVG(response_time_ms) as avg_response_time
+         FROM telemetry.chat_history
+         WHERE timestamp >= :since) AS chat,
+        -- Booking statistics
+        (SELECT COUNT(*) as total_bookings,
+                SUM(total_amount) as total_revenue,
+                AVG(total_amount) as avg_booking_value
+         FROM bookings
+         WHERE created_at >= :since) AS booking,
+        -- Room utilization
+        (SELECT COUNT(CASE WHEN status = 'available' THEN 1 END) as available_rooms,
+                COUNT(CASE WHEN status = 'occupied' THEN 1 END) as occupied_rooms,
+                COUNT(CASE WHEN status = 'maintenance' THEN 1 END) as maintenance_rooms,
+                COUNT(*) as total_rooms
+         FROM rooms) AS room
+"""
+_SET_CONFIG_SQL: Final = """
+    INSERT OR REPLACE INTO hotel_config
+    (config_key, config_value, description, updated_by_user_id, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+_LOG_EVENT_SQL: Final = "INSERT INTO telemetry.analytics_events (event_type, event_data, user_id, session_id) VALUES (?, ?, ?, ?)"
+_USER_BY_USERNAME_SQL: Final = "SELECT * FROM users WHERE username = ?"
+_ROOM_BY_NUMBER_SQL: Final = "SELECT * FROM rooms WHERE room_number = ?"
+_GET_CONFIG_SQL: Final = "SELECT config_value FROM hotel_config WHERE config_key = ?"
+_PRIMED_LOOKUPS = (_USER_BY_USERNAME_SQL, _ROOM_BY_NUMBER_SQL, _GET_CONFIG_SQL)
+
+def sqlite_cutoff(days: float = 0, hours: float = 0) -> str:
+    """UTC timestamp in CURRENT_TIMESTAMP's format for the given time ago.
+
+    Comparing a column against this bound string is a plain range check the
+    timestamp indexes can serve, unlike calling datetime() inside the query.
+    """
+    return (datetime.now(timezone.utc) - timedelta(days=days, hours=hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+# Chat and analytics rows are buffered and written in one executemany transaction
+WRITE_BEHIND_INTERVAL_SECONDS = 0.25
+WRITE_BEHIND_MAX_ROWS = 1000  # Flush early once this many rows are waiting
+
+# User/room/config lookups are read on every auth check and rarely change
+LOOKUP_CACHE_SIZE = 512
+LOOKUP_CACHE_TTL_SECONDS = 60
+
 class DatabaseManager:
     """Enhanced database manager with comprehensive hotel management features"""
     
-    def __init__(self, db_path: str = None):
+    # (main, telemetry) database file pairs whose schema has already been created in this process
+    _initialized_paths: set = set()
+    
+    def __init__(self, db_path: str = None, telemetry_path: str = None):
         self.db_path = db_path or CONFIG.DB_FILE
+        self.telemetry_path = telemetry_path or DB_CONFIG.TELEMETRY_DB_FILE
+        # One connection per thread, opened on first use and kept for the life of the thread
+        self._local = threading.local()
+        # Write-behind buffers for save_chat_enhanced / log_analytics_event
+        self._chat_buf: deque = deque()
+        self._event_buf: deque = deque()
+        self._buf_lock = threading.Lock()
+        self._flush_wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        # Rows are immutable, so cached lookups can be shared between callers
+        self._lookup_cache = InMemoryCache(max_size=LOOKUP_CACHE_SIZE, default_ttl=LOOKUP_CACHE_TTL_SECONDS)
         self.init_enhanced_tables()
     
-    def get_connection(self):
-        """Get database connection with foreign key support"""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA foreign_keys = ON")
-        conn.row_factory = sqlite3.Row
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this thread's database connection with foreign key support.
+
+        Use it as ``with self.get_connection() as conn:`` - the block commits on
+        success and rolls back on error, but the connection stays open for reuse.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=DB_CONFIG.DB_TIMEOUT, check_same_thread=False, cached_statements=256)
+            self._configure(conn)
+            self._prime_statements(conn)
+            self._local.conn = conn
         return conn
     
+    def _configure(self, conn: sqlite3.Connection):
+        """Per-connection settings, applied once when the connection is opened"""
+        conn.row_factory = sqlite3.Row
+        # ATTACH is per connection, so the telemetry file is attached on every open
+        conn.execute("ATTACH DATABASE ? AS telemetry", (self.telemetry_path,))
+        # Bookings get full durability; losing the last few chat/analytics rows on power loss is fine
+        conn.executescript("""
+            PRAGMA foreign_keys = ON;
+            PRAGMA main.synchronous = FULL;
+            PRAGMA telemetry.synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+        """)
+    
+    def _prime_statements(self, conn: sqlite3.Connection):
+        """Compile the hot lookups into the connection's statement cache before the first request"""
+        for sql in _PRIMED_LOOKUPS:
+            try:
+                conn.execute(sql, ('',)).fetchall()
+            except sqlite3.Error:
+                # Schema not created yet (first connection, before init_enhanced_tables)
+                pass
+    
     def init_enhanced_tables(self):
         """Initialize all database tables with enhanced schema"""
-        with self.get_connection() as conn:
-            # Users table with enhanced authentication
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    email TEXT UNIQUE,
-                    full_name TEXT,
-                    role TEXT DEFAULT 'user',
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    api_key_hash TEXT,
-                    phone TEXT,
-                    preferences TEXT  -- JSON string for user preferences
-                )
-            """)
-            
-            # Enhanced rooms table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS rooms (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    room_number TEXT UNIQUE NOT NULL,
-                    room_type TEXT DEFAULT 'standard',
-                    floor INTEGER,
-                    max_occupancy INTEGER DEFAULT 2,
-                    price_per_night REAL DEFAULT 0.0,
-                    amenities TEXT,  -- JSON string
-                    status TEXT DEFAULT 'available',
-                    last_cleaned TIMESTAMP,
-                    maintenance_notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Enhanced bookings table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    booking_reference TEXT UNIQUE NOT NULL,
-                    room_id INTEGER NOT NULL,
-                    guest_name TEXT NOT NULL,
-                    guest_email TEXT,
-                    guest_phone TEXT,
-                    check_in_date DATE NOT NULL,
-                    check_out_date DATE NOT NULL,
-                    total_amount REAL DEFAULT 0.0,
-                    status TEXT DEFAULT 'confirmed',
-                    special_requests TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_by_user_id INTEGER,
-                    FOREIGN KEY (room_id) REFERENCES rooms (id),
-                    FOREIGN KEY (created_by_user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Enhanced chat history
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS chat_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    response_source TEXT DEFAULT 'unknown',
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    user_id INTEGER,
-                    sentiment_score REAL,
-                    intent_classification TEXT,
-                    response_time_ms INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # System logs table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS system_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    log_level TEXT NOT NULL,
-                    module TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    user_id INTEGER,
-                    ip_address TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    additional_data TEXT,  -- JSON string
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Analytics events table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS analytics_events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    event_type TEXT NOT NULL,
-                    event_data TEXT NOT NULL,  -- JSON string
-                    user_id INTEGER,
-                    session_id TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Hotel configuration table
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS hotel_config (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    config_key TEXT UNIQUE NOT NULL,
-                    config_value TEXT NOT NULL,
-                    config_type TEXT DEFAULT 'string',
-                    description TEXT,
-                    updated_by_user_id INTEGER,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (updated_by_user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Create indexes for better performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_dates ON bookings(check_in_date, check_out_date)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_session ON chat_history(session_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_timestamp ON chat_history(timestamp)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_rooms_status ON rooms(status)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_analytics_type ON analytics_events(event_type)")
-            
-            conn.commit()
-            logger.info("Enhanced database tables initialized successfully")
+        # DDL is idempotent, but another manager on the same files has already paid for it
+        paths = (self.db_path, self.telemetry_path)
+        if paths in DatabaseManager._initialized_paths:
+            return
+        conn = self.get_connection()
+        for schema, objects, script in (('main', _SCHEMA_OBJECTS, _SCHEMA_SQL),
+                                        ('telemetry', _TELEMETRY_SCHEMA_OBJECTS, _TELEMETRY_SCHEMA_SQL)):
+            # Another process (or an earlier run) may have created everything already
+            existing = conn.execute(
+                f"SELECT COUNT(*) FROM {schema}.sqlite_master WHERE name IN ({', '.join('?' * len(objects))})",
+                objects
+            ).fetchone()[0]
+            if existing < len(objects):
+                # WAL is stored in the database file, so it only has to be switched on once
+                conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+                conn.executescript(script)
+        DatabaseManager._initialized_paths.add(paths)
+        logger.info("Enhanced database tables initialized successfully")
+    
+    # Write-behind buffering
+    def _buffer_row(self, buf: deque, row: tuple):
+        with self._buf_lock:
+            buf.append(row)
+            pending = len(self._chat_buf) + len(self._event_buf)
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_loop, name="db-write-behind", daemon=True)
+                self._flusher.start()
+        if pending >= WRITE_BEHIND_MAX_ROWS:
+            self._flush_wakeup.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_wakeup.wait(WRITE_BEHIND_INTERVAL_SECONDS)
+            self._flush_wakeup.clear()
+            try:
+                self.flush_sync()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def _get_writer_connection(self):
+        """This thread's apsw connection for write-behind flushes, opened on first use"""
+        conn = getattr(self._local, 'writer', None)
+        if conn is None:
+            conn = apsw.Connection(self.db_path)
+            conn.setbusytimeout(DB_CONFIG.DB_TIMEOUT * 1000)
+            cursor = conn.cursor()
+            cursor.execute("ATTACH DATABASE ? AS telemetry", (self.telemetry_path,))
+            cursor.execute("PRAGMA telemetry.synchronous = NORMAL")
+            self._local.writer = conn
+        return conn
+
+    def flush_sync(self):
+        """Write all buffered chat and analytics rows now; call on shutdown"""
+        with self._buf_lock:
+            chats, events = list(self._chat_buf), list(self._event_buf)
+            self._chat_buf.clear()
+            self._event_buf.clear()
+        if not chats and not events:
+            return
+        # apsw binds parameters in C and drops the GIL while SQLite writes, so the
+        # flusher thread stops competing with the event loop; sqlite3 is the fallback
+        use_apsw = DB_CONFIG.APSW_WRITER_ENABLED and apsw is not None
+        try:
+            with (self._get_writer_connection() if use_apsw else self.get_connection()) as conn:
+                cursor = conn.cursor()
+                if chats:
+                    cursor.executemany(_SAVE_CHAT_SQL, chats)
+                if events:
+                    cursor.executemany(_LOG_EVENT_SQL, events)
+        except Exception:
+            # The transaction rolled back; put the rows back ahead of anything buffered since
+            with self._buf_lock:
+                self._chat_buf.extendleft(reversed(chats))
+                self._event_buf.extendleft(reversed(events))
+            raise
     
     # User Management Methods
     def create_user(self, username: str, password_hash: str, email: str = None, 
                    full_name: str = None, role: str = 'user') -> int:
         """Create a new user"""
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                INSERT INTO users (username, password_hash, email, full_name, role)
-                VALUES (?, ?, ?, ?, ?)
-            """, (username, password_hash, email, full_name, role))
-            return cursor.lastrowid
+            cursor = conn.execute(_CREATE_USER_SQL, (username, password_hash, email, full_name, role))
+        self._lookup_cache.delete(username, prefix='user')
+        return cursor.lastrowid
     
-    def get_user_by_username(self, username: str) -> Optional[Dict]:
+    def get_user_by_username(self, username: str) -> Optional[sqlite3.Row]:
         """Get user by username"""
-        with self.get_connection() as conn:
-            row = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-            return dict(row) if row else None
+        row = self._lookup_cache.get(username, prefix='user')
+        if row is None:
+            with self.get_connection() as conn:
+                row = conn.execute(_USER_BY_USERNAME_SQL, (username,)).fetchone()
+            if row is not None:
+                self._lookup_cache.set(username, row, prefix='user')
+        return row
     
     def update_user_last_login(self, user_id: int):
         """Update user's last login timestamp"""
         with self.get_connection() as conn:
-            conn.execute("""
-                UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
-            """, (user_id,))
+            conn.execute(_UPDATE_LAST_LOGIN_SQL, (user_id,))
+        # Cached by username, so drop them all rather than look the name up
+        self._lookup_cache.clear(prefix='user')
     
     # Enhanced Room Management
     def create_room(self, room_number: str, room_type: str = 'standard', 
@@ -182,47 +408,32 @@ class DatabaseManager:
                    price_per_night: float = 0.0, amenities: str = None) -> int:
         """Create a new room"""
         with self.get_connection() as conn:
-            cursor = conn.execute("""
-                INSERT INTO rooms (room_number, room_type, floor, max_occupancy, 
-                                 price_per_night, amenities)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (room_number, room_type, floor, max_occupancy, price_per_night, amenities))
-            return cursor.lastrowid
+            cursor = conn.execute(_CREATE_ROOM_SQL, (room_number, room_type, floor, max_occupancy, price_per_night, amenities))
+        self._lookup_cache.delete(room_number, prefix='room')
+        return cursor.lastrowid
     
-    def get_room_by_number(self, room_number: str) -> Optional[Dict]:
+    def get_room_by_number(self, room_number: str) -> Optional[sqlite3.Row]:
         """Get room by room number"""
-        with self.get_connection() as conn:
-            row = conn.execute("SELECT * FROM rooms WHERE room_number = ?", (room_number,)).fetchone()
-            return dict(row) if row else None
+        row = self._lookup_cache.get(room_number, prefix='room')
+        if row is None:
+            with self.get_connection() as conn:
+                row = conn.execute(_ROOM_BY_NUMBER_SQL, (room_number,)).fetchone()
+            if row is not None:
+                self._lookup_cache.set(room_number, row, prefix='room')
+        return row
     
-    def get_available_rooms(self, check_in: str, check_out: str) -> List[Dict]:
-        """Get rooms available for specified dates"""
+    def get_available_rooms(self, check_in: str, check_out: str) -> List[sqlite3.Row]:
+        """Get rooms available for specified dates (sqlite3.Row supports row['col'] and dict(row))"""
         with self.get_connection() as conn:
-            rows = conn.execute("""
-                SELECT r.* FROM rooms r
-                WHERE r.status = 'available'
-                AND r.id NOT IN (
-                    SELECT b.room_id FROM bookings b
-                    WHERE b.status IN ('confirmed', 'checked_in')
-                    AND NOT (b.check_out_date <= ? OR b.check_in_date >= ?)
-                )
-            """, (check_in, check_out)).fetchall()
-            return [dict(row) for row in rows]
+            return conn.execute(_AVAILABLE_ROOMS_SQL, (check_in, check_out)).fetchall()
     
     # Enhanced Booking Management
     def create_booking(self, booking_data: Dict) -> str:
         """Create a new booking and return booking reference"""
-        import uuid
-        booking_reference = f"BK{uuid.uuid4().hex[:8].upper()}"
-        
         with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO bookings (booking_reference, room_id, guest_name, guest_email,
-                                    guest_phone, check_in_date, check_out_date, total_amount,
-                                    special_requests, created_by_user_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                booking_reference,
+            # Take the write lock up front so the insert and the room update commit together
+            conn.execute("BEGIN IMMEDIATE")
+            booking_reference = conn.execute(_CREATE_BOOKING_SQL, (
                 booking_data.get('room_id'),
                 booking_data.get('guest_name'),
                 booking_data.get('guest_email'),
@@ -232,108 +443,95 @@ class DatabaseManager:
                 booking_data.get('total_amount', 0.0),
                 booking_data.get('special_requests'),
                 booking_data.get('created_by_user_id')
-            ))
+            )).fetchone()[0]
             
             # Update room status if needed
             if booking_data.get('room_id'):
-                conn.execute("""
-                    UPDATE rooms SET status = 'occupied', updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (booking_data.get('room_id'),))
-            
-            return booking_reference
+                conn.execute(_OCCUPY_ROOM_SQL, (booking_data.get('room_id'),))
+        if booking_data.get('room_id'):
+            # Room status changed; rooms are cached by number, not id
+            self._lookup_cache.clear(prefix='room')
+        return booking_reference
     
-    def get_booking_by_reference(self, booking_reference: str) -> Optional[Dict]:
+    def get_booking_by_reference(self, booking_reference: str) -> Optional[sqlite3.Row]:
         """Get booking by reference number"""
         with self.get_connection() as conn:
-            row = conn.execute("""
-                SELECT b.*, r.room_number, r.room_type
-                FROM bookings b
-                JOIN rooms r ON b.room_id = r.id
-                WHERE b.booking_reference = ?
-            """, (booking_reference,)).fetchone()
-            return dict(row) if row else None
+            return conn.execute(_BOOKING_BY_REFERENCE_SQL, (booking_reference,)).fetchone()
     
     # Enhanced Chat History
     def save_chat_enhanced(self, session_id: str, user_message: str, bot_response: str,
                           response_source: str = 'unknown', user_id: int = None,
                           sentiment_score: float = None, intent_classification: str = None,
                           response_time_ms: int = None):
-        """Save chat with enhanced metadata"""
-        with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO chat_history (session_id, user_message, bot_response, 
-                                        response_source, user_id, sentiment_score,
-                                        intent_classification, response_time_ms)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (session_id, user_message, bot_response, response_source, user_id,
-                  sentiment_score, intent_classification, response_time_ms))
+        """Save chat with enhanced metadata (buffered, written within WRITE_BEHIND_INTERVAL_SECONDS)"""
+        self._buffer_row(self._chat_buf, (session_id, user_message, bot_response, response_source, user_id,
+                                          sentiment_score, intent_classification, response_time_ms))
     
     # Analytics Methods
     def log_analytics_event(self, event_type: str, event_data: Dict, 
                            user_id: int = None, session_id: str = None):
-        """Log analytics event"""
-        import json
-        with self.get_connection() as conn:
-            conn.execute("""
-                INSERT INTO analytics_events (event_type, event_data, user_id, session_id)
-                VALUES (?, ?, ?, ?)
-            """, (event_type, json.dumps(event_data), user_id, session_id))
+        """Log analytics event (buffered, written within WRITE_BEHIND_INTERVAL_SECONDS)"""
+        self._buffer_row(self._event_buf, (event_type, _dumps(event_data), user_id, session_id))
     
     def get_analytics_summary(self, days: int = 30) -> Dict:
         """Get analytics summary for specified number of days"""
+        # Include rows still sitting in the write-behind buffer
+        self.flush_sync()
         with self.get_connection() as conn:
-            # Chat statistics
-            chat_stats = conn.execute("""
-                SELECT COUNT(*) as total_chats,
-                       COUNT(DISTINCT session_id) as unique_sessions,
-                       AVG(response_time_ms) as avg_response_time
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
-            """.format(days)).fetchone()
-            
-            # Booking statistics
-            booking_stats = conn.execute("""
-                SELECT COUNT(*) as total_bookings,
-                       SUM(total_amount) as total_revenue,
-                       AVG(total_amount) as avg_booking_value
-                FROM bookings
-                WHERE created_at >= datetime('now', '-{} days')
-            """.format(days)).fetchone()
-            
-            # Room utilization
-            room_stats = conn.execute("""
-                SELECT 
-                    COUNT(CASE WHEN status = 'available' THEN 1 END) as available_rooms,
-                    COUNT(CASE WHEN status = 'occupied' THEN 1 END) as occupied_rooms,
-                    COUNT(CASE WHEN status = 'maintenance' THEN 1 END) as maintenance_rooms,
-                    COUNT(*) as total_rooms
-                FROM rooms
-            """).fetchone()
+            # One statement for all three aggregates; the cutoff is a bound parameter,
+            # so the cached prepared statement is reused for every value of days
+            row = conn.execute(_ANALYTICS_SUMMARY_SQL, {'since': sqlite_cutoff(days=days)}).fetchone()
             
             return {
-                'chat_stats': dict(chat_stats) if chat_stats else {},
-                'booking_stats': dict(booking_stats) if booking_stats else {},
-                'room_stats': dict(room_stats) if room_stats else {},
+                'chat_stats': {key: row[key] for key in ('total_chats', 'unique_sessions', 'avg_response_time')},
+                'booking_stats': {key: row[key] for key in ('total_bookings', 'total_revenue', 'avg_booking_value')},
+                'room_stats': {key: row[key] for key in ('available_rooms', 'occupied_rooms', 'maintenance_rooms', 'total_rooms')},
                 'period_days': days
             }
     
     # System Configuration
     def get_config(self, key: str, default_value: str = None) -> str:
         """Get configuration value"""
-        with self.get_connection() as conn:
-            row = conn.execute("SELECT config_value FROM hotel_config WHERE config_key = ?", (key,)).fetchone()
-            return row[0] if row else default_value
+        value = self._lookup_cache.get(key, prefix='config')
+        if value is None:
+            with self.get_connection() as conn:
+                row = conn.execute(_GET_CONFIG_SQL, (key,)).fetchone()
+            if row is None:
+                return default_value
+            value = row[0]
+            self._lookup_cache.set(key, value, prefix='config')
+        return value
     
     def set_config(self, key: str, value: str, description: str = None, 
                   updated_by_user_id: int = None):
         """Set configuration value"""
         with self.get_connection() as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO hotel_config 
-                (config_key, config_value, description, updated_by_user_id, updated_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (key, value, description, updated_by_user_id))
-
-# Global database manager instance
-db_manager = DatabaseManager()
+            conn.execute(_SET_CONFIG_SQL, (key, value, description, updated_by_user_id))
+        self._lookup_cache.delete(key, prefix='config')
+
+# Global database manager instance, created on first use rather than at import
+_db_manager: Optional[DatabaseManager] = None
+_db_manager_lock = threading.Lock()
+
+def get_db_manager() -> DatabaseManager:
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager()
+    return _db_manager
+
+class _LazyDatabaseManager:
+    """Stand-in for the global DatabaseManager that opens it on the first attribute access"""
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        return getattr(get_db_manager(), name)
+
+    def flush_if_initialized(self):
+        """Flush buffered writes, without creating the manager if nothing ever used it"""
+        if _db_manager is not None:
+            _db_manager.flush_sync()
+
+# Importing this name (main, analytics, notifications, dashboard) no longer opens the database
+db_manager = _LazyDatabaseManager()
@@ -1,154 +1,264 @@
 # database/operations.py
 import sqlite3
 import uuid
+import queue
 import logging
-import hashlib
-from typing import Dict, List, Optional
-from config.settings import CONFIG, ROOM_NUMBERS
+import bcrypt
+import threading
+from contextlib import contextmanager
+from typing import Dict, Final, Iterator, List, Optional, Tuple
+from config.settings import CONFIG, DB_CONFIG, ROOM_NUMBERS, ROOM_NUMBER_SET, env_config
 
-def db_connection():
-    conn = sqlite3.connect(CONFIG.DB_FILE, check_same_thread=False)
+# Idle connections kept open for reuse; overflow connections are closed on release
+_pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+_pool_slots = threading.BoundedSemaphore(env_config.db_pool_size + env_config.db_max_overflow)
+
+# Available room numbers and booked room rows, refilled lazily after any booking change.
+# The version guards against a slow reader storing a list that predates an invalidation.
+_available_rooms_cache: Optional[List[str]] = None
+_booked_rooms_cache: Optional[List[Dict]] = None
+_available_rooms_version = 0
+
+# Hot statements, kept as constants so every call hits the connection's statement cache
+_ALL_ROOMS_SQL: Final = "SELECT * FROM rooms ORDER BY roomNumber"
+_AVAILABLE_ROOMS_SQL: Final = "SELECT roomNumber FROM rooms WHERE status = 'Available' ORDER BY roomNumber"
+_BOOKED_ROOMS_SQL: Final = "SELECT * FROM rooms WHERE status = 'Booked' ORDER BY roomNumber"
+_ROOM_BY_NUMBER_SQL: Final = "SELECT * FROM rooms WHERE roomNumber = ?"
+_BOOKED_ROOM_BY_NUMBER_SQL: Final = "SELECT * FROM rooms WHERE roomNumber = ? AND status = 'Booked'"
+_BOOK_ROOM_SQL: Final = "UPDATE rooms SET status = 'Booked', reserveStartDate = ?, reserveEndDate = ?, note = ? WHERE roomNumber = ? AND status = 'Available' RETURNING *"
+_CANCEL_ROOM_SQL: Final = """
+    UPDATE rooms 
+    SET status = 'Available', 
+        reserveStartDate = NULL, 
+        reserveEndDate = NULL, 
+        note = ? 
+    WHERE roomNumber = ? AND status = 'Booked'
+    RETURNING *
+"""
+_LOG_CHAT_SQL: Final = "INSERT INTO chat_history (message_id, session_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)"
+# (sql, params) run once per new connection. Reads only: even a no-op UPDATE takes the
+# write lock, which would stall an overflow connection opened while a booking commits.
+_PRIMED_STATEMENTS = (
+    (_ALL_ROOMS_SQL, ()),
+    (_AVAILABLE_ROOMS_SQL, ()),
+    (_BOOKED_ROOMS_SQL, ()),
+    (_ROOM_BY_NUMBER_SQL, ('',)),
+    (_BOOKED_ROOM_BY_NUMBER_SQL, ('',)),
+)
+
+def _prime_statements(conn: sqlite3.Connection):
+    """Compile the hot statements into the connection's cache before the first request needs them"""
+    for sql, params in _PRIMED_STATEMENTS:
+        try:
+            conn.execute(sql, params).fetchall()
+        except sqlite3.Error:
+            # Schema not created yet (first connection, inside setup_database)
+            return
+
+def _create_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(CONFIG.DB_FILE, timeout=DB_CONFIG.DB_TIMEOUT, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # Per-connection settings are applied once, when the connection is opened
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Pooled connections live long enough for a larger page cache and mmap reads to pay off
+    conn.execute("PRAGMA cache_size=-64000")  # ~64MB
+    conn.execute("PRAGMA mmap_size=268435456")  # 256MB
+    _prime_statements(conn)
     return conn
 
+@contextmanager
+def get_conn() -> Iterator[sqlite3.Connection]:
+    """Borrow a pooled SQLite connection for the duration of a with-block"""
+    if not _pool_slots.acquire(timeout=DB_CONFIG.DB_TIMEOUT):
+        raise sqlite3.OperationalError("Timed out waiting for a database connection")
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _create_connection()
+    try:
+        yield conn
+    finally:
+        # Never hand the next borrower a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        if _pool.qsize() < env_config.db_pool_size:
+            _pool.put(conn)
+        else:
+            conn.close()
+        _pool_slots.release()
+
 def setup_database():
-    conn = db_connection()
-    cursor = conn.cursor()
-    cursor.execute("CREATE TABLE IF NOT EXISTS rooms (roomId TEXT PRIMARY KEY, roomNumber TEXT UNIQUE NOT NULL, status TEXT NOT NULL, reserveStartDate TEXT, reserveEndDate TEXT, note TEXT)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS chat_history (message_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL, role TEXT DEFAULT 'admin', created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
-    cursor.execute("SELECT COUNT(*) FROM rooms")
-    if cursor.fetchone()[0] == 0:
-        logging.info("Populating rooms table.")
-        for room_num in ROOM_NUMBERS:
-            cursor.execute("INSERT INTO rooms (roomId, roomNumber, status) VALUES (?, ?, ?)", (f"R-{uuid.uuid4().hex[:6]}", room_num, 'Available'))
+    with get_conn() as conn:
+        # WAL is stored in the database file, so it only has to be switched on once
+        conn.execute("PRAGMA journal_mode=WAL")
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS rooms (roomId TEXT PRIMARY KEY, roomNumber TEXT UNIQUE NOT NULL, status TEXT NOT NULL, reserveStartDate TEXT, reserveEndDate TEXT, note TEXT)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS chat_history (message_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL, role TEXT DEFAULT 'admin', created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+        # Covers the status-filtered, roomNumber-ordered listings without touching the table
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_rooms_status_num ON rooms(status, roomNumber)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_session_ts ON chat_history(session_id, timestamp)")
+        # Superseded by idx_chat_session_ts (same leading column); dropping it saves a write per insert
+        cursor.execute("DROP INDEX IF EXISTS idx_chat_session")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_user_session_ts ON chat_history(session_id, timestamp) WHERE role = 'user'")
+        # Existence probes stop at the first row instead of counting the table
+        cursor.execute("SELECT 1 FROM rooms LIMIT 1")
+        if cursor.fetchone() is None:
+            logging.info("Populating rooms table.")
+            cursor.executemany(
+                "INSERT INTO rooms (roomId, roomNumber, status) VALUES (?, ?, ?)",
+                [(f"R-{uuid.uuid4().hex[:6]}", room_num, 'Available') for room_num in ROOM_NUMBERS]
+            )
     
-    # Setup default admin user
-    cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
-    if cursor.fetchone()[0] == 0:
-        admin_password_hash = hashlib.sha256("admin123".encode()).hexdigest()
-        cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", ("admin", admin_password_hash, "admin"))
-        logging.info("Default admin user created (username: admin, password: admin123)")
+        # Setup default admin user
+        cursor.execute("SELECT 1 FROM users WHERE username = 'admin' LIMIT 1")
+        if cursor.fetchone() is None:
+            admin_password_hash = bcrypt.hashpw("admin123".encode(), bcrypt.gensalt(rounds=12)).decode()
+            cursor.execute("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)", ("admin", admin_password_hash, "admin"))
+            logging.info("Default admin user created (username: admin, password: admin123)")
     
-    conn.commit()
-    conn.close()
+        conn.commit()
+    # Open the rest of the idle pool now, so early requests do not pay for connect + PRAGMAs
+    while _pool.qsize() < env_config.db_pool_size:
+        _pool.put(_create_connection())
     logging.info("Database setup complete.")
 
+def log_chat_messages(rows: List[Tuple[str, str, str, str, str]]):
+    """Insert many (message_id, session_id, role, content, timestamp) chat_history rows in one transaction"""
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(_LOG_CHAT_SQL, rows)
+        conn.commit()
+
+def get_all_rooms_from_db() -> List[Dict]:
+    with get_conn() as conn:
+        cursor = conn.execute(_ALL_ROOMS_SQL)
+        return [dict(row) for row in cursor.fetchall()]
+
+def invalidate_available_rooms_cache():
+    """Drop the cached available and booked room listings"""
+    global _available_rooms_cache, _booked_rooms_cache, _available_rooms_version
+    _available_rooms_version += 1
+    _available_rooms_cache = None
+    _booked_rooms_cache = None
+
 def get_available_rooms_from_db() -> List[str]:
-    conn = db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT roomNumber FROM rooms WHERE status = 'Available' ORDER BY roomNumber")
-    rooms = [row['roomNumber'] for row in cursor.fetchall()]
-    conn.close()
-    return rooms
+    global _available_rooms_cache
+    rooms = _available_rooms_cache
+    if rooms is None:
+        version = _available_rooms_version
+        with get_conn() as conn:
+            cursor = conn.execute(_AVAILABLE_ROOMS_SQL)
+            rooms = [row['roomNumber'] for row in cursor.fetchall()]
+        if version == _available_rooms_version:
+            _available_rooms_cache = rooms
+    return list(rooms)
 
 def get_room_details_from_db(room_number: str) -> Optional[Dict]:
-    conn = db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM rooms WHERE roomNumber = ?", (room_number,))
-    room = cursor.fetchone()
-    conn.close()
+    # The rooms table is seeded from ROOM_NUMBERS, so unknown numbers never need a query
+    if room_number not in ROOM_NUMBER_SET:
+        return None
+    with get_conn() as conn:
+        room = conn.execute(_ROOM_BY_NUMBER_SQL, (room_number,)).fetchone()
     return dict(room) if room else None
 
-def book_room_in_db(room_number: str, start_date: str, end_date: str, note: str) -> bool:
-    conn = db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE rooms SET status = 'Booked', reserveStartDate = ?, reserveEndDate = ?, note = ? WHERE roomNumber = ? AND status = 'Available'",(start_date, end_date, note, room_number))
-        conn.commit()
-        return cursor.rowcount > 0
-    except sqlite3.Error as e:
-        logging.error(f"DB error on booking: {e}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+def book_room_in_db(room_number: str, start_date: str, end_date: str, note: str) -> Optional[Dict]:
+    """Book an available room; returns the booked row, or None if it could not be booked"""
+    if room_number not in ROOM_NUMBER_SET:
+        return None
+    with get_conn() as conn:
+        try:
+            # RETURNING hands back the updated row from the same statement, so no follow-up SELECT
+            room = conn.execute(_BOOK_ROOM_SQL, (start_date, end_date, note, room_number)).fetchone()
+            conn.commit()
+            if room is None:
+                return None
+            invalidate_available_rooms_cache()
+            return dict(room)
+        except sqlite3.Error as e:
+            logging.error(f"DB error on booking: {e}")
+            conn.rollback()
+            return None
 
 def get_booked_rooms() -> List[Dict]:
     """Get all booked rooms"""
-    conn = db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM rooms WHERE status = 'Booked' ORDER BY roomNumber")
-    rooms = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return rooms
+    global _booked_rooms_cache
+    rooms = _booked_rooms_cache
+    if rooms is None:
+        version = _available_rooms_version
+        with get_conn() as conn:
+            cursor = conn.execute(_BOOKED_ROOMS_SQL)
+            rooms = [dict(row) for row in cursor.fetchall()]
+        if version == _available_rooms_version:
+            _booked_rooms_cache = rooms
+    # Callers get their own dicts, so nothing they change leaks into the cache
+    return [dict(room) for room in rooms]
 
 def update_room_booking(room_number: str, new_start_date: Optional[str] = None, 
-                       new_end_date: Optional[str] = None, note: Optional[str] = None) -> bool:
-    """Update existing room booking"""
-    conn = db_connection()
-    cursor = conn.cursor()
+                       new_end_date: Optional[str] = None, note: Optional[str] = None) -> Optional[Dict]:
+    """Update existing room booking; returns the updated row, or None if the room is not booked"""
+    if room_number not in ROOM_NUMBER_SET:
+        return None
+    with get_conn() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Check if room is currently booked
-        cursor.execute("SELECT * FROM rooms WHERE roomNumber = ? AND status = 'Booked'", (room_number,))
-        room = cursor.fetchone()
+        try:
+            # Prepare update query
+            update_fields = []
+            update_values = []
         
-        if not room:
-            return False
+            if new_start_date:
+                update_fields.append("reserveStartDate = ?")
+                update_values.append(new_start_date)
         
-        # Prepare update query
-        update_fields = []
-        update_values = []
+            if new_end_date:
+                update_fields.append("reserveEndDate = ?")
+                update_values.append(new_end_date)
         
-        if new_start_date:
-            update_fields.append("reserveStartDate = ?")
-            update_values.append(new_start_date)
+            if note is not None:
+                update_fields.append("note = ?")
+                update_values.append(note)
         
-        if new_end_date:
-            update_fields.append("reserveEndDate = ?")
-            update_values.append(new_end_date)
+            if not update_fields:
+                # Nothing to change; just report the booking as it stands
+                room = cursor.execute(_BOOKED_ROOM_BY_NUMBER_SQL, (room_number,)).fetchone()
+                return dict(room) if room else None
         
-        if note is not None:
-            update_fields.append("note = ?")
-            update_values.append(note)
-        
-        if update_fields:
+            # The status check rides on the UPDATE itself; no row back means the room is not booked
             update_values.append(room_number)
-            query = f"UPDATE rooms SET {', '.join(update_fields)} WHERE roomNumber = ?"
-            cursor.execute(query, update_values)
+            query = f"UPDATE rooms SET {', '.join(update_fields)} WHERE roomNumber = ? AND status = 'Booked' RETURNING *"
+            room = cursor.execute(query, update_values).fetchone()
             conn.commit()
-            return cursor.rowcount > 0
-        
-        return True
+            if room is None:
+                return None
+            invalidate_available_rooms_cache()
+            return dict(room)
         
-    except sqlite3.Error as e:
-        logging.error(f"DB error on booking update: {e}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"DB error on booking update: {e}")
+            conn.rollback()
+            return None
 
-def cancel_room_booking(room_number: str, reason: Optional[str] = None) -> bool:
-    """Cancel room booking and make it available"""
-    conn = db_connection()
-    cursor = conn.cursor()
+def cancel_room_booking(room_number: str, reason: Optional[str] = None) -> Optional[Dict]:
+    """Cancel room booking and make it available; returns the freed row, or None if it was not booked"""
+    if room_number not in ROOM_NUMBER_SET:
+        return None
+    with get_conn() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Check if room is currently booked
-        cursor.execute("SELECT * FROM rooms WHERE roomNumber = ? AND status = 'Booked'", (room_number,))
-        room = cursor.fetchone()
-        
-        if not room:
-            return False
-        
-        # Cancel booking
-        cancel_note = f"Cancelled: {reason}" if reason else "Cancelled"
-        cursor.execute("""
-            UPDATE rooms 
-            SET status = 'Available', 
-                reserveStartDate = NULL, 
-                reserveEndDate = NULL, 
-                note = ? 
-            WHERE roomNumber = ?
-        """, (cancel_note, room_number))
+        try:
+            # Cancel booking; only a booked room matches, so no row back means nothing to cancel
+            cancel_note = f"Cancelled: {reason}" if reason else "Cancelled"
+            room = cursor.execute(_CANCEL_ROOM_SQL, (cancel_note, room_number)).fetchone()
         
-        conn.commit()
-        return cursor.rowcount > 0
+            conn.commit()
+            if room is None:
+                return None
+            invalidate_available_rooms_cache()
+            return dict(room)
         
-    except sqlite3.Error as e:
-        logging.error(f"DB error on booking cancellation: {e}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"DB error on booking cancellation: {e}")
+            conn.rollback()
+            return None
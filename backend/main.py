@@ -7,21 +7,29 @@
 # 3. YOUR fine-tuned LLM for intelligent answer generation.
 # 4. A timeout fallback mechanism for fast responses.
 
+import os
+
+# Must be set before torch is first imported so the caching allocator picks it up
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:128")
+
 import uvicorn
 import logging
 import torchvision
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import configuration and utilities
-from config.settings import CONFIG
+from config.settings import CONFIG, env_config
 from utils.logging_config import setup_logging
 
 # Import database setup
 from database.operations import setup_database
+from database.models import db_manager
 
 # Import ML model loading
 from services.ml_models import load_all_models_and_data
+from services.chatbot import start_history_writer, stop_history_writer
 
 # Import all route modules
 from routes.auth_routes import router as auth_router
@@ -83,18 +91,12 @@ app = FastAPI(
         "name": "MIT",
     },
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration
-origins = ["*"]
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# CORS configuration (origins come from CORS_ORIGINS)
+app.add_middleware(CORSMiddleware, **env_config.get_cors_config())
 
 # Add custom middleware if available
 if MIDDLEWARE_AVAILABLE:
@@ -120,11 +122,21 @@ app.include_router(dashboard_router)
 async def startup_event():
     """Initialize database and load ML models on startup"""
     setup_database()
+    start_history_writer()
     load_all_models_and_data()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush chat history and analytics rows still waiting for the background writers"""
+    await stop_history_writer()
+    db_manager.flush_if_initialized()
+
 # --- Main Execution Block ---
 if __name__ == "__main__":
     print(f"Database file: {CONFIG.DB_FILE}")
     port = 8000
     logging.info(f"\n✅ Starting server optimized for RTX 3050 Ti Mobile on http://0.0.0.0:{port}...")
-    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+    # One worker on purpose: the models, conversation states and refresh tokens live in this
+    # process. Concurrency comes from the event loop - generation runs on the generation_queue
+    # thread, so HTTP/DB work is never serialized behind the GPU.
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info", workers=1)
@@ -3,35 +3,40 @@ from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
-from collections import defaultdict
-from typing import Dict
+import numpy as np
+
+# Clients are hashed into this many buckets (a power of two); colliding clients share a limit
+NUM_BUCKETS = 4096
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, calls: int = 100, period: int = 60):
         super().__init__(app)
         self.calls = calls
         self.period = period
-        self.requests: Dict[str, list] = defaultdict(list)
+        # One ring of the last `calls` request times per bucket, in a single fixed-size
+        # array, so memory does not grow with the number of distinct clients.
+        # -inf marks unused slots, which are always outside the window.
+        self.times = np.full((NUM_BUCKETS, calls), -np.inf, dtype=np.float64)
+        # Index of the oldest slot in each ring
+        self.head = np.zeros(NUM_BUCKETS, dtype=np.int32)
 
     async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if now - req_time < self.period
-        ]
+        bucket = hash(request.client.host) & (NUM_BUCKETS - 1)
+        # Monotonic, so wall-clock adjustments cannot reset or extend a window
+        now = time.monotonic()
+        head = self.head[bucket]
         
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.calls:
+        # Check rate limit: if the oldest of the last `calls` requests is still
+        # inside the window, this one would be one too many
+        if now - self.times[bucket, head] < self.period:
             raise HTTPException(
                 status_code=429,
                 detail="Rate limit exceeded. Please try again later."
             )
         
-        # Add current request
-        self.requests[client_ip].append(now)
+        # Add current request over the oldest slot
+        self.times[bucket, head] = now
+        self.head[bucket] = (head + 1) % self.calls
         
         response = await call_next(request)
         return response
@@ -1,8 +1,12 @@
 # models/schemas.py
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Dict, List, Optional
 
-class Query(BaseModel):
+class RequestModel(BaseModel):
+    """Base for request bodies: strict types skip coercion attempts, and bodies are read-only"""
+    model_config = ConfigDict(strict=True, extra='ignore', frozen=True)
+
+class Query(RequestModel):
     text: str = Field(..., description="User's question or message")
     session_id: str = Field(..., description="Unique session identifier for conversation tracking")
 
@@ -33,7 +37,7 @@ class FlatHistoryEntry(BaseModel):
     content: Dict[str, str]
 
 # --- Authentication Models ---
-class LoginRequest(BaseModel):
+class LoginRequest(RequestModel):
     username: str
     password: str
 
@@ -46,7 +50,7 @@ class LoginResponse(BaseModel):
     user_id: str
     role: str
 
-class RefreshTokenRequest(BaseModel):
+class RefreshTokenRequest(RequestModel):
     refresh_token: str
 
 class RefreshTokenResponse(BaseModel):
@@ -56,12 +60,12 @@ class RefreshTokenResponse(BaseModel):
     expires_in: int  # seconds
 
 # --- Booking Management Models ---
-class BookingUpdateRequest(BaseModel):
+class BookingUpdateRequest(RequestModel):
     room_number: str
     new_start_date: Optional[str] = None
     new_end_date: Optional[str] = None
     note: Optional[str] = None
 
-class BookingCancelRequest(BaseModel):
+class BookingCancelRequest(RequestModel):
     room_number: str
     reason: Optional[str] = None
@@ -4,12 +4,14 @@ Advanced Model Optimization and Management System
 Includes quantization, pruning, and ONNX conversion for better performance
 """
 
+import io
 import os
 import torch
 import logging
+import numpy as np
 import shutil
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import json
 import time
 from dataclasses import dataclass
@@ -23,9 +25,25 @@ class ModelOptimizationConfig:
     enable_quantization: bool = True
     enable_pruning: bool = False
     target_device: str = "cpu"  # cpu, cuda, mps
-    optimization_level: str = "balanced"  # fast, balanced, best
+    optimization_level: str = "balanced"  # fast, balanced, best (SmoothQuant ONNX INT8)
     max_model_size_mb: int = 1000
     backup_original: bool = True
+    # torch-saved list of example inputs (tensors or tuples of tensors) for static INT8
+    # calibration; defaults to <models_dir>/calib/calibration.pt
+    calibration_samples: Optional[str] = None
+    smooth_quant_alpha: float = 0.5
+
+class _CalibrationLoader:
+    """Minimal dataloader in the shape neural-compressor expects: batch_size plus (inputs, label) pairs"""
+    batch_size = 1
+    
+    def __init__(self, samples: List[Tuple]):
+        self.samples = samples
+    
+    def __iter__(self):
+        for sample in self.samples:
+            arrays = [tensor.numpy() for tensor in sample]
+            yield (arrays[0] if len(arrays) == 1 else arrays), 0
 
 class AdvancedModelManager:
     def __init__(self, models_dir: str = "/app/models", config: Optional[ModelOptimizationConfig] = None):
@@ -46,6 +64,7 @@ class AdvancedModelManager:
             self.registry = {
                 "models": {},
                 "optimizations": {},
+                "manifest_cache": {},
                 "last_updated": time.time()
             }
     
@@ -69,41 +88,173 @@ class AdvancedModelManager:
             "path": str(model_path)
         }
     
-    def optimize_pytorch_model(self, model_path: str, output_path: Optional[str] = None) -> str:
-        """Optimize PyTorch model with quantization and other techniques"""
+    def _load_model(self, model_path: Path):
+        """Load a checkpoint without going through torch.load's slow file-object path"""
+        if model_path.suffix == '.safetensors':
+            from safetensors.torch import load_file
+            return load_file(str(model_path), device='cpu')
+        if model_path.suffix == '.pt2':
+            return torch.export.load(str(model_path))
+        try:
+            return torch.load(model_path, map_location='cpu', mmap=True)
+        except RuntimeError:
+            # Legacy (non-zipfile) checkpoints can't be memory-mapped; read them in one go instead
+            with open(model_path, 'rb') as f:
+                buffer = io.BytesIO(f.read())
+            return torch.load(buffer, map_location='cpu')
+    
+    def _save_model(self, model, output_path: Path) -> Path:
+        """Save as safetensors when the weights are plain tensors, else fall back to torch.save"""
+        state = model.state_dict() if isinstance(model, torch.nn.Module) else model
+        if isinstance(state, dict) and state and all(
+            isinstance(t, torch.Tensor) and not t.is_quantized for t in state.values()
+        ):
+            from safetensors.torch import save_file, save_model
+            output_path = output_path.with_suffix('.safetensors')
+            if isinstance(model, torch.nn.Module):
+                save_model(model, str(output_path))  # handles tied weights
+            else:
+                save_file({k: t.contiguous() for k, t in state.items()}, str(output_path))
+            return output_path
+        # Dynamically quantized modules hold packed params safetensors can't represent
+        torch.save(model, output_path)
+        return output_path
+    
+    def _load_calibration_inputs(self) -> Optional[List[Tuple]]:
+        """Representative inputs for static quantization, or None when none were provided"""
+        calib_path = Path(self.config.calibration_samples) if self.config.calibration_samples \
+            else self.models_dir / "calib" / "calibration.pt"
+        if not calib_path.exists():
+            return None
+        samples = torch.load(calib_path, map_location='cpu')
+        return [sample if isinstance(sample, tuple) else (sample,) for sample in samples]
+    
+    def _quantize_static_pt2e(self, model: torch.nn.Module, calib_inputs: List[Tuple]):
+        """Export, calibrate and convert to a static INT8 program for the x86 Inductor backend"""
+        from torch.ao.quantization.quantize_pt2e import prepare_pt2e, convert_pt2e
+        from torch.ao.quantization.quantizer.x86_inductor_quantizer import (
+            X86InductorQuantizer, get_default_x86_inductor_quantization_config
+        )
+        
+        example_inputs = calib_inputs[0]
+        with torch.no_grad():
+            if hasattr(torch.export, 'export_for_training'):
+                graph = torch.export.export_for_training(model, example_inputs).module()
+            else:
+                from torch._export import capture_pre_autograd_graph
+                graph = capture_pre_autograd_graph(model, example_inputs)
+            
+            quantizer = X86InductorQuantizer().set_global(get_default_x86_inductor_quantization_config())
+            prepared = prepare_pt2e(graph, quantizer)
+            # Observers record activation ranges, so activations are INT8 too, not just weights
+            for sample in calib_inputs:
+                prepared(*sample)
+            converted = convert_pt2e(prepared, fold_quantize=True)
+            return torch.export.export(converted, example_inputs)
+    
+    def _quantize_smoothquant_onnx(self, model: torch.nn.Module, calib_inputs: List[Tuple], output_path: Path):
+        """Export to ONNX and statically quantize it with SmoothQuant via neural-compressor"""
+        from neural_compressor import quantization
+        from neural_compressor.config import PostTrainingQuantConfig
+        
+        example_inputs = calib_inputs[0]
+        input_names = [f"input_{i}" for i in range(len(example_inputs))]
+        tmp_onnx = output_path.with_name(output_path.name + ".export.onnx")
+        try:
+            torch.onnx.export(
+                model, example_inputs, str(tmp_onnx), opset_version=17,
+                input_names=input_names, dynamic_axes={name: {0: "batch"} for name in input_names}
+            )
+            # Smoothing migrates activation outliers into the per-channel weight scales, so the
+            # graph stays on INT8 GEMMs rather than dequantizing around outlier-heavy ops
+            conf = PostTrainingQuantConfig(
+                approach="static",
+                recipes={"smooth_quant": True, "smooth_quant_args": {"alpha": self.config.smooth_quant_alpha}}
+            )
+            quantized = quantization.fit(str(tmp_onnx), conf, calib_dataloader=_CalibrationLoader(calib_inputs))
+            if quantized is None:
+                raise RuntimeError("neural-compressor returned no quantized model")
+            quantized.save(str(output_path))
+        finally:
+            tmp_onnx.unlink(missing_ok=True)
+    
+    def optimize_pytorch_model(self, model_path: str, output_path: Optional[str] = None,
+                               measure_load_time: bool = False) -> str:
+        """Optimize PyTorch model with quantization and other techniques.
+
+        With optimization_level="best" and calibration samples, the model is exported to ONNX and
+        quantized with SmoothQuant static INT8 (.quant.onnx, served by onnxruntime). Otherwise,
+        with calibration samples available, modules get static INT8 (weights and activations)
+        through the PT2E flow and are saved as an ExportedProgram (.int8.pt2); load it with
+        torch.export.load(path).module() and wrap in torch.compile(backend="inductor") to get
+        the fused INT8 kernels. Otherwise, or if export fails, Linear layers are dynamically
+        quantized as before. Each static path falls back to the next one if it fails.
+        measure_load_time=True also reloads the output to record its load time in the registry.
+        """
         model_path = Path(model_path)
         if not model_path.exists():
             raise FileNotFoundError(f"Model not found: {model_path}")
         
-        output_path = Path(output_path) if output_path else model_path.with_suffix('.optimized.pt')
-        
         logger.info(f"Optimizing model: {model_path}")
         
         try:
             # Load model
-            model = torch.load(model_path, map_location='cpu')
+            start_time = time.time()
+            model = self._load_model(model_path)
+            original_load_time = time.time() - start_time
             original_size = model_path.stat().st_size / (1024 * 1024)
+            method = None
             
             # Apply optimizations based on config
-            if self.config.enable_quantization and hasattr(torch, 'quantization'):
-                logger.info("Applying dynamic quantization...")
-                if hasattr(model, 'eval'):
-                    model.eval()
+            if self.config.enable_quantization and isinstance(model, torch.nn.Module):
+                model.eval()
+                calib_inputs = self._load_calibration_inputs()
+                if calib_inputs and self.config.optimization_level == "best":
+                    logger.info(f"Applying SmoothQuant static INT8 (alpha={self.config.smooth_quant_alpha})...")
+                    try:
+                        onnx_path = Path(output_path) if output_path else model_path.with_suffix('.quant.onnx')
+                        self._quantize_smoothquant_onnx(model, calib_inputs, onnx_path)
+                        output_path = onnx_path
+                        method = "smoothquant_static_int8"
+                    except Exception as e:
+                        logger.warning(f"SmoothQuant failed, falling back to PT2E: {e}")
+                
+                if calib_inputs and method is None:
+                    logger.info(f"Applying static INT8 quantization ({len(calib_inputs)} calibration samples)...")
+                    try:
+                        program = self._quantize_static_pt2e(model, calib_inputs)
+                        output_path = Path(output_path) if output_path else model_path.with_suffix('.int8.pt2')
+                        torch.export.save(program, output_path)
+                        method = "pt2e_static_int8"
+                    except Exception as e:
+                        logger.warning(f"Static quantization failed, falling back to dynamic: {e}")
+                
+                if method is None and hasattr(torch, 'quantization'):
+                    logger.info("Applying dynamic quantization...")
                     # Dynamic quantization for inference
-                    quantized_model = torch.quantization.quantize_dynamic(
+                    model = torch.quantization.quantize_dynamic(
                         model, {torch.nn.Linear}, dtype=torch.qint8
                     )
-                    model = quantized_model
+                    method = "dynamic_int8"
             
-            # Save optimized model
-            torch.save(model, output_path)
+            # Save optimized model (the static paths have already written theirs)
+            if method in (None, "dynamic_int8"):
+                output_path = Path(output_path) if output_path else model_path.with_suffix('.optimized.pt')
+                output_path = self._save_model(model, output_path)
             optimized_size = output_path.stat().st_size / (1024 * 1024)
+            optimized_load_time = None
+            if measure_load_time:
+                optimized_load_time = self.validate_model_performance(output_path).get("load_time_seconds")
             
             # Update registry
             self.registry["optimizations"][str(model_path)] = {
                 "original_size_mb": original_size,
                 "optimized_size_mb": optimized_size,
                 "compression_ratio": original_size / optimized_size if optimized_size > 0 else 1,
+                "method": method,
+                "backend": "onnxruntime" if method == "smoothquant_static_int8" else "torch",
+                "output_path": str(output_path),
+                "load_time_seconds": {"original": original_load_time, "optimized": optimized_load_time},
                 "optimization_date": time.time(),
                 "config": self.config.__dict__
             }
@@ -118,14 +269,129 @@ class AdvancedModelManager:
             logger.error(f"Failed to optimize model {model_path}: {e}")
             raise
     
+    def quantize_llm_awq(self, base_model: str, adapter_path: str, output_dir: str,
+                         w_bit: int = 4, q_group_size: int = 128) -> str:
+        """Merge LoRA adapters into the base LLM and pre-quantize it with AWQ for fused INT4 inference"""
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        from peft import PeftModel
+        from awq import AutoAWQForCausalLM
+        
+        output_dir = Path(output_dir)
+        merged_dir = output_dir.with_name(output_dir.name + "-merged")
+        
+        logger.info(f"Merging LoRA adapters from {adapter_path} into {base_model}")
+        model = AutoModelForCausalLM.from_pretrained(base_model, torch_dtype=torch.float16, trust_remote_code=True)
+        model = PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+        tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=True)
+        model.save_pretrained(merged_dir, safe_serialization=True)
+        tokenizer.save_pretrained(merged_dir)
+        del model
+        
+        logger.info(f"Quantizing merged model with AWQ (w_bit={w_bit}, group_size={q_group_size})")
+        awq_model = AutoAWQForCausalLM.from_pretrained(str(merged_dir), safetensors=True)
+        awq_model.quantize(tokenizer, quant_config={
+            "zero_point": True,
+            "q_group_size": q_group_size,
+            "w_bit": w_bit,
+            "version": "GEMM"
+        })
+        awq_model.save_quantized(str(output_dir), safetensors=True)
+        tokenizer.save_pretrained(output_dir)
+        shutil.rmtree(merged_dir, ignore_errors=True)
+        
+        self.registry["optimizations"][str(adapter_path)] = {
+            "method": "awq",
+            "w_bit": w_bit,
+            "q_group_size": q_group_size,
+            "output_path": str(output_dir),
+            "optimization_date": time.time()
+        }
+        self.save_registry()
+        
+        logger.info(f"AWQ model saved to {output_dir}")
+        return str(output_dir)
+    
+    def export_retriever_onnx_int8(self, model_name: str, output_dir: str,
+                                   quantization_config: str = "avx512_vnni") -> str:
+        """Export the sentence-transformers retriever to ONNX and dynamically quantize it to INT8"""
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+        
+        logger.info(f"Exporting retriever {model_name} to ONNX ({quantization_config} INT8)")
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+        model.save_pretrained(output_dir)
+        export_dynamic_quantized_onnx_model(model, quantization_config, output_dir)
+        
+        logger.info(f"Quantized retriever saved to {output_dir}")
+        return output_dir
+    
+    def convert_knowledge_base_fp16(self, kb_path: str, output_path: Optional[str] = None) -> str:
+        """Re-save knowledge base embeddings as FP16 so the server can mmap half the bytes"""
+        kb_path = Path(kb_path)
+        output_path = Path(output_path) if output_path else kb_path
+        
+        kb_data = torch.load(kb_path, map_location='cpu')
+        original_size = kb_path.stat().st_size / (1024 * 1024)
+        kb_data['embeddings'] = kb_data['embeddings'].to(torch.float16)
+        
+        tmp_path = output_path.with_suffix('.tmp')
+        torch.save(kb_data, tmp_path)
+        tmp_path.replace(output_path)
+        optimized_size = output_path.stat().st_size / (1024 * 1024)
+        
+        logger.info(f"Knowledge base converted to FP16: {original_size:.1f}MB -> {optimized_size:.1f}MB")
+        return str(output_path)
+    
+    def export_knowledge_base_npy(self, kb_path: str, npy_path: str, chunks_path: str) -> str:
+        """Export KB embeddings as a unit-normalized FP16 .npy the server can memory-map, chunks as JSON"""
+        kb_data = torch.load(kb_path, map_location='cpu')
+        embeddings = torch.nn.functional.normalize(kb_data['embeddings'].float(), dim=-1)
+        np.save(npy_path, embeddings.to(torch.float16).numpy())
+        with open(chunks_path, 'w', encoding='utf-8') as f:
+            json.dump(list(kb_data['chunks']), f, ensure_ascii=False)
+        
+        logger.info(f"Knowledge base exported: {embeddings.shape[0]} x {embeddings.shape[1]} FP16 -> {npy_path}")
+        return npy_path
+    
+    def _validate_onnx_performance(self, model_path: Path) -> Dict[str, Any]:
+        """Session creation and one zero-input run on onnxruntime's CPU provider"""
+        import onnxruntime as ort
+        
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        start_time = time.time()
+        session = ort.InferenceSession(str(model_path), sess_options, providers=['CPUExecutionProvider'])
+        load_time = time.time() - start_time
+        
+        dtypes = {'tensor(float)': np.float32, 'tensor(int64)': np.int64, 'tensor(int32)': np.int32}
+        feeds = {
+            inp.name: np.zeros([d if isinstance(d, int) else 1 for d in inp.shape], dtype=dtypes.get(inp.type, np.float32))
+            for inp in session.get_inputs()
+        }
+        start_time = time.time()
+        session.run(None, feeds)
+        inference_time = time.time() - start_time
+        
+        model_size = model_path.stat().st_size / (1024 * 1024)
+        return {
+            "valid": True,
+            "backend": "onnxruntime",
+            "load_time_seconds": load_time,
+            "model_size_mb": model_size,
+            "inference_time_seconds": inference_time,
+            "memory_efficient": model_size < self.config.max_model_size_mb
+        }
+    
     def validate_model_performance(self, model_path: str) -> Dict[str, Any]:
         """Validate model loading performance"""
         model_path = Path(model_path)
         
         try:
+            if model_path.suffix == '.onnx':
+                return self._validate_onnx_performance(model_path)
+            
             # Measure loading time
             start_time = time.time()
-            model = torch.load(model_path, map_location='cpu')
+            model = self._load_model(model_path)
             load_time = time.time() - start_time
             
             # Get model info
@@ -159,8 +425,15 @@ class AdvancedModelManager:
                 "error": str(e)
             }
     
-    def create_model_manifest(self) -> Dict[str, Any]:
-        """Create a manifest of all models and their status"""
+    def create_model_manifest(self, deep: bool = False) -> Dict[str, Any]:
+        """Create a manifest of all models and their status.
+
+        Stat-only by default. deep=True also runs validate_model_performance (a full load) on
+        files whose mtime/size changed since the cached result in registry["manifest_cache"].
+        """
+        cache = self.registry.setdefault("manifest_cache", {})
+        seen = set()
+        cache_dirty = False
         manifest = {
             "timestamp": time.time(),
             "models": {},
@@ -178,7 +451,19 @@ class AdvancedModelManager:
             for model_path in self.models_dir.rglob(f'*{ext}'):
                 rel_path = str(model_path.relative_to(self.models_dir))
                 info = self.get_model_info(model_path)
-                performance = self.validate_model_performance(model_path)
+                stat = model_path.stat()
+                key = str(model_path)
+                seen.add(key)
+                
+                cached = cache.get(key)
+                if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                    performance = cached["performance"]
+                elif deep:
+                    performance = self.validate_model_performance(model_path)
+                    cache[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "performance": performance}
+                    cache_dirty = True
+                else:
+                    performance = {}
                 
                 manifest["models"][rel_path] = {
                     **info,
@@ -190,6 +475,13 @@ class AdvancedModelManager:
                     manifest["total_size_mb"] += info["size_mb"]
                     manifest["optimization_summary"]["total_models"] += 1
         
+        # Forget files that are gone so the cache doesn't grow with every retired checkpoint
+        for key in [key for key in cache if key not in seen]:
+            del cache[key]
+            cache_dirty = True
+        if cache_dirty:
+            self.save_registry()
+        
         # Add optimization statistics
         for opt_path, opt_info in self.registry.get("optimizations", {}).items():
             manifest["optimization_summary"]["optimized_models"] += 1
@@ -219,8 +511,8 @@ def main():
     """Main optimization routine"""
     manager = AdvancedModelManager()
     
-    # Create manifest
-    manifest = manager.create_model_manifest()
+    # Create manifest (deep: the optimization pass below needs each model's "valid" flag)
+    manifest = manager.create_model_manifest(deep=True)
     print("\n📊 Model Manifest:")
     print(f"Total models: {manifest['optimization_summary']['total_models']}")
     print(f"Total size: {manifest['total_size_mb']:.1f}MB")
@@ -1,20 +1,73 @@
 # routes/auth_routes.py
+import asyncio
+import hashlib
+import heapq
 import secrets
 import time
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException, Depends, Header
 from models.schemas import LoginRequest, LoginResponse, RefreshTokenRequest, RefreshTokenResponse
 from services.auth import authenticate_user, verify_refresh_token, create_tokens
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Store for refresh tokens (in production, use database or Redis)
-refresh_tokens_store = {}
+REFRESH_TOKEN_TTL_SECONDS = 7 * 24 * 3600
+REFRESH_TOKEN_STORE_SIZE = 10_000
+
+class TokenStore:
+    """Refresh tokens with lazy expiry: a min-heap of expiry times is drained on every write.
+
+    Tokens are kept only as blake2b digests, so the raw values never sit in process memory.
+    Process-local (in production with several workers, use database or Redis).
+    """
+    
+    def __init__(self, max_size: int = REFRESH_TOKEN_STORE_SIZE):
+        self.max_size = max_size
+        self._data: Dict[bytes, dict] = {}
+        self._heap: List[Tuple[float, bytes]] = []
+    
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+    
+    def _pop_heap(self):
+        """Drop the soonest-expiring heap entry and its token, unless the token was already removed"""
+        expires_at, key = heapq.heappop(self._heap)
+        entry = self._data.get(key)
+        if entry is not None and entry["expires_at"] == expires_at:
+            del self._data[key]
+    
+    def set(self, token: str, data: dict, ttl: int = REFRESH_TOKEN_TTL_SECONDS):
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            self._pop_heap()
+        # At capacity the tokens closest to expiry go first
+        while self._data and len(self._data) >= self.max_size:
+            self._pop_heap()
+        # Tokens revoked before expiry leave heap entries behind; rebuild before they pile up
+        if len(self._heap) > 2 * self.max_size:
+            self._heap = [(entry["expires_at"], key) for key, entry in self._data.items()]
+            heapq.heapify(self._heap)
+        
+        key = self._key(token)
+        expires_at = now + ttl
+        self._data[key] = {**data, "expires_at": expires_at}
+        heapq.heappush(self._heap, (expires_at, key))
+    
+    def pop(self, token: str) -> Optional[dict]:
+        """Remove a token, returning its data (expired or not) if it was stored"""
+        return self._data.pop(self._key(token), None)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+refresh_tokens_store = TokenStore()
 
 @router.post("/login/", response_model=LoginResponse)
 async def login(login_request: LoginRequest):
     """User login endpoint with refresh token support"""
-    user = authenticate_user(login_request.username, login_request.password)
+    # bcrypt takes ~100ms and releases the GIL; on a worker thread it no longer stalls the event loop
+    user = await asyncio.to_thread(authenticate_user, login_request.username, login_request.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
@@ -23,13 +76,11 @@ async def login(login_request: LoginRequest):
     refresh_token = secrets.token_urlsafe(32)
     
     # Store refresh token with expiration (7 days)
-    expires_at = datetime.utcnow() + timedelta(days=7)
-    refresh_tokens_store[refresh_token] = {
+    refresh_tokens_store.set(refresh_token, {
         "user_id": user["user_id"],
         "username": user["username"],
-        "role": user["role"],
-        "expires_at": expires_at
-    }
+        "role": user["role"]
+    })
     
     return LoginResponse(
         access_token=access_token,
@@ -44,16 +95,14 @@ async def login(login_request: LoginRequest):
 @router.post("/refresh/", response_model=RefreshTokenResponse)
 async def refresh_token(refresh_request: RefreshTokenRequest):
     """Refresh access token using refresh token"""
-    refresh_token = refresh_request.refresh_token
+    # Refresh tokens are single-use: the old one is removed whatever the outcome
+    token_data = refresh_tokens_store.pop(refresh_request.refresh_token)
     
-    if refresh_token not in refresh_tokens_store:
+    if token_data is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
     
-    token_data = refresh_tokens_store[refresh_token]
-    
     # Check if refresh token is expired
-    if datetime.utcnow() > token_data["expires_at"]:
-        del refresh_tokens_store[refresh_token]
+    if time.time() > token_data["expires_at"]:
         raise HTTPException(status_code=401, detail="Refresh token expired")
     
     # Generate new tokens
@@ -61,14 +110,11 @@ async def refresh_token(refresh_request: RefreshTokenRequest):
     new_refresh_token = secrets.token_urlsafe(32)
     
     # Update refresh token store
-    del refresh_tokens_store[refresh_token]  # Remove old token
-    expires_at = datetime.utcnow() + timedelta(days=7)
-    refresh_tokens_store[new_refresh_token] = {
+    refresh_tokens_store.set(new_refresh_token, {
         "user_id": token_data["user_id"],
         "username": token_data["username"],
-        "role": token_data["role"],
-        "expires_at": expires_at
-    }
+        "role": token_data["role"]
+    })
     
     return RefreshTokenResponse(
         access_token=new_access_token,
@@ -80,9 +126,6 @@ async def refresh_token(refresh_request: RefreshTokenRequest):
 @router.post("/logout/")
 async def logout(refresh_request: RefreshTokenRequest):
     """Logout endpoint to invalidate refresh token"""
-    refresh_token = refresh_request.refresh_token
-    
-    if refresh_token in refresh_tokens_store:
-        del refresh_tokens_store[refresh_token]
+    refresh_tokens_store.pop(refresh_request.refresh_token)
     
     return {"message": "Successfully logged out"}
@@ -1,10 +1,11 @@
 # routes/booking_routes.py
+import asyncio
 from typing import List
 from fastapi import APIRouter, HTTPException
+from config.settings import ROOM_NUMBER_SET
 from models.schemas import Room, StandardResponse, BookingUpdateRequest, BookingCancelRequest
 from database.operations import (
-    get_booked_rooms, update_room_booking, cancel_room_booking,
-    get_room_details_from_db, book_room_in_db
+    get_booked_rooms, update_room_booking, cancel_room_booking, book_room_in_db
 )
 
 router = APIRouter(prefix="/bookings", tags=["Booking Management"])
@@ -12,12 +13,13 @@ router = APIRouter(prefix="/bookings", tags=["Booking Management"])
 @router.get("/", response_model=List[Room])
 async def get_booked_rooms_api():
     """Get all currently booked rooms"""
-    return get_booked_rooms()
+    return await asyncio.to_thread(get_booked_rooms)
 
 @router.put("/update/", response_model=StandardResponse)
 async def update_booking(update_request: BookingUpdateRequest):
     """Update an existing room booking"""
-    success = update_room_booking(
+    success = await asyncio.to_thread(
+        update_room_booking,
         room_number=update_request.room_number,
         new_start_date=update_request.new_start_date,
         new_end_date=update_request.new_end_date,
@@ -32,7 +34,8 @@ async def update_booking(update_request: BookingUpdateRequest):
 @router.post("/cancel/", response_model=StandardResponse)
 async def cancel_booking(cancel_request: BookingCancelRequest):
     """Cancel a room booking"""
-    success = cancel_room_booking(
+    success = await asyncio.to_thread(
+        cancel_room_booking,
         room_number=cancel_request.room_number,
         reason=cancel_request.reason
     )
@@ -53,18 +56,14 @@ async def create_manual_booking(booking_data: dict):
     if not all([room_number, start_date, end_date]):
         raise HTTPException(status_code=400, detail="room_number, start_date, and end_date are required")
     
-    # Check if room exists and is available
-    room_details = get_room_details_from_db(room_number)
-    if not room_details:
+    # The rooms table is seeded from ROOM_NUMBERS, so existence needs no query
+    if room_number not in ROOM_NUMBER_SET:
         raise HTTPException(status_code=404, detail=f"Room {room_number} not found")
     
-    if room_details['status'] != 'Available':
-        raise HTTPException(status_code=400, detail=f"Room {room_number} is not available")
-    
-    # Book the room
-    success = book_room_in_db(room_number, start_date, end_date, note)
+    # Book the room; the availability check is part of the UPDATE, which returns the booked row
+    booked = await asyncio.to_thread(book_room_in_db, room_number, start_date, end_date, note)
     
-    if success:
-        return StandardResponse(message=f"Room {room_number} booked successfully from {start_date} to {end_date}")
+    if booked:
+        return StandardResponse(message=f"Room {room_number} booked successfully from {booked['reserveStartDate']} to {booked['reserveEndDate']}")
     else:
-        raise HTTPException(status_code=500, detail="Failed to create booking")
+        raise HTTPException(status_code=400, detail=f"Room {room_number} is not available")
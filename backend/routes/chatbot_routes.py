@@ -1,8 +1,10 @@
 # routes/chatbot_routes.py
+import json
 from typing import List, Dict
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from models.schemas import Query, Answer, StandardResponse
-from services.chatbot import generate_orchestrated_answer
+from services.chatbot import generate_orchestrated_answer, stream_orchestrated_answer
 from services.conversation import convo_manager
 from services.ml_models import model_store
 
@@ -18,6 +20,20 @@ async def ask_question(query: Query):
     reply, source = await generate_orchestrated_answer(query.text, query.session_id)
     return Answer(reply=reply, source=source, session_id=query.session_id)
 
+@router.post("/ask/stream/")
+async def ask_question_stream(query: Query):
+    """Chatbot endpoint that streams the reply as server-sent events while it is generated"""
+    if not model_store.models_loaded: 
+        raise HTTPException(status_code=503, detail="Models are not loaded yet.")
+    if not query.text.strip(): 
+        raise HTTPException(status_code=400, detail="Query text cannot be empty.")
+
+    async def event_stream():
+        async for event in stream_orchestrated_answer(query.text, query.session_id):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @router.post("/clear_session/", response_model=StandardResponse)
 async def clear_session(query: dict):
     """Clear conversation session"""
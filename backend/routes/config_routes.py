@@ -4,6 +4,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from models.schemas import StandardResponse
 from config.settings import CONFIG
 from services.auth import authenticate_user
+from services.conversation import refresh_keyword_patterns
 
 router = APIRouter(prefix="/config", tags=["Configuration"])
 
@@ -70,6 +71,7 @@ async def add_booking_keyword(keyword_data: Dict[str, str]):
         raise HTTPException(status_code=400, detail="Keyword cannot be empty")
     
     CONFIG.BOOKING_INTENT_KEYWORDS.add(keyword.lower())
+    refresh_keyword_patterns()
     
     return StandardResponse(
         message=f"Added booking keyword: {keyword}"
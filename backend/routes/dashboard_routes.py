@@ -50,7 +50,7 @@ async def get_dashboard_summary():
         with db_manager.get_connection() as conn:
             recent_chats = conn.execute("""
                 SELECT session_id, user_message, bot_response, timestamp, response_source
-                FROM chat_history
+                FROM telemetry.chat_history
                 ORDER BY timestamp DESC
                 LIMIT 10
             """).fetchall()
@@ -200,7 +200,7 @@ async def get_chat_performance_dashboard(days: int = Query(default=30, ge=1, le=
                     MIN(response_time_ms) as min_response_time,
                     MAX(response_time_ms) as max_response_time,
                     COUNT(*) as message_count
-                FROM chat_history
+                FROM telemetry.chat_history
                 WHERE timestamp >= datetime('now', '-{} days')
                 AND response_time_ms IS NOT NULL
                 GROUP BY DATE(timestamp)
@@ -214,7 +214,7 @@ async def get_chat_performance_dashboard(days: int = Query(default=30, ge=1, le=
                     user_message,
                     COUNT(*) as frequency,
                     AVG(response_time_ms) as avg_response_time
-                FROM chat_history
+                FROM telemetry.chat_history
                 WHERE timestamp >= datetime('now', '-{} days')
                 GROUP BY LOWER(TRIM(user_message))
                 HAVING COUNT(*) > 1
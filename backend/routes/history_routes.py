@@ -1,81 +1,73 @@
 # routes/history_routes.py
-from typing import List, Dict
+import json
+from typing import Iterator, List, Dict
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from models.schemas import HistoryEntry, FlatHistoryEntry
-from database.operations import db_connection
+from database.operations import get_conn
 
 router = APIRouter(prefix="/history", tags=["Chat History"])
 
-@router.get("/allContent", response_model=Dict[str, List[HistoryEntry]])
-async def get_all_sessions_and_history():
-    """Retrieves the complete chat history for all sessions."""
-    sessions_with_history = {}
-    conn = db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT session_id, role, content, timestamp
-        FROM chat_history
-        ORDER BY session_id, timestamp ASC
-    """)
-    all_history_records = cursor.fetchall()
-    conn.close()
-
-    if not all_history_records:
-        return {}
+def stream_all_sessions_and_history() -> Iterator[str]:
+    """Yield the {session_id: [messages]} JSON object one session at a time"""
+    with get_conn() as conn:
+        cursor = conn.execute("""
+            SELECT
+                session_id,
+                json_group_array(json_object('role', role, 'content', content, 'timestamp', timestamp)) as messages
+            FROM (
+                SELECT session_id, role, content, timestamp
+                FROM chat_history
+                ORDER BY session_id, timestamp ASC
+            )
+            GROUP BY session_id
+            ORDER BY session_id
+        """)
 
-    for record in all_history_records:
-        session_id = record['session_id']
-        if session_id not in sessions_with_history:
-            sessions_with_history[session_id] = []
-        
-        sessions_with_history[session_id].append({
-            "role": record['role'],
-            "content": record['content'],
-            "timestamp": record['timestamp']
-        })
+        yield "{"
+        separator = ""
+        for record in cursor:
+            yield f"{separator}{json.dumps(record['session_id'])}:{record['messages']}"
+            separator = ","
+        yield "}"
 
-    return sessions_with_history
+@router.get("/allContent", responses={200: {"model": Dict[str, List[HistoryEntry]]}})
+async def get_all_sessions_and_history():
+    """Retrieves the complete chat history for all sessions."""
+    # JSON is assembled by SQLite and streamed as-is, so there is no per-row Python/Pydantic work
+    return StreamingResponse(stream_all_sessions_and_history(), media_type="application/json")
 
-@router.get("/all", response_model=List[FlatHistoryEntry])
+@router.get("/all", responses={200: {"model": List[FlatHistoryEntry]}})
 async def get_all_sessions_first_messages():
     """Retrieves only the first user input from every session."""
+    # Shape is fixed by the query, so rows go straight to orjson without a pydantic pass
     flat_history_list = []
-    conn = db_connection()
-    cursor = conn.cursor()
+    with get_conn() as conn:
+        cursor = conn.cursor()
 
-    sql_query = """
-        WITH RankedMessages AS (
+        # SQLite takes bare columns from the MIN(timestamp) row, so this is one
+        # idx_chat_user_session_ts walk per session instead of sorting every user row
+        sql_query = """
             SELECT
                 session_id,
                 role,
                 content,
-                timestamp,
-                ROW_NUMBER() OVER(PARTITION BY session_id ORDER BY timestamp ASC) as rn
+                MIN(timestamp) AS timestamp
             FROM
                 chat_history
             WHERE
                 role = 'user'
-        )
-        SELECT
-            session_id,
-            role,
-            content,
-            timestamp
-        FROM
-            RankedMessages
-        WHERE
-            rn = 1
-        ORDER BY
-            timestamp DESC;
-    """
+            GROUP BY
+                session_id
+            ORDER BY
+                timestamp DESC;
+        """
 
-    cursor.execute(sql_query)
-    first_user_inputs = cursor.fetchall()
-    conn.close()
+        cursor.execute(sql_query)
+        first_user_inputs = cursor.fetchall()
 
     if not first_user_inputs:
-        return []
+        return ORJSONResponse([])
 
     for record in first_user_inputs:
         content_data = {
@@ -88,16 +80,15 @@ async def get_all_sessions_first_messages():
             "content": content_data
         })
 
-    return flat_history_list
+    return ORJSONResponse(flat_history_list)
 
-@router.get("/{session_id}", response_model=List[HistoryEntry])
+@router.get("/{session_id}", responses={200: {"model": List[HistoryEntry]}})
 async def get_session_history(session_id: str):
     """Get history for a specific session"""
-    conn = db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT role, content, timestamp FROM chat_history WHERE session_id = ? ORDER BY timestamp ASC", (session_id,))
-    history = cursor.fetchall()
-    conn.close()
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT role, content, timestamp FROM chat_history WHERE session_id = ? ORDER BY timestamp ASC", (session_id,))
+        history = cursor.fetchall()
     if not history:
         raise HTTPException(status_code=404, detail="Session ID not found or history is empty.")
-    return [dict(row) for row in history]
+    return ORJSONResponse([dict(row) for row in history])
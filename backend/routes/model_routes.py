@@ -3,6 +3,8 @@ from fastapi import APIRouter, HTTPException
 from models.schemas import StandardResponse
 from services.ml_models import model_store, cleanup_gpu_memory, check_gpu_memory
 from config.settings import CONFIG
+from services.cache import cache_service
+from services.conversation import intent_score
 
 router = APIRouter(prefix="/models", tags=["Model Management"])
 
@@ -41,10 +43,19 @@ async def reload_models():
         # Reset model store
         model_store.models_loaded = False
         model_store.retriever = None
+        model_store.retriever_device = None
         model_store.generator_llm = None
         model_store.tokenizer = None
         model_store.rag_chunks = []
         model_store.rag_embeddings = None
+        model_store.rag_index = None
+        model_store.static_cache = None
+        model_store.system_prompt_ids = None
+        model_store.system_prompt_kv = None
+        
+        # Cached query embeddings belong to the old retriever
+        cache_service.ml_cache.clear(prefix='embedding')
+        intent_score.cache_clear()
         
         # Clean up memory
         cleanup_gpu_memory()
@@ -4,7 +4,7 @@ import psutil
 from datetime import datetime
 from fastapi import APIRouter
 from services.ml_models import check_gpu_memory, model_store
-from database.operations import db_connection
+from database.operations import get_conn
 import torch
 
 router = APIRouter(prefix="/system", tags=["System"])
@@ -12,16 +12,20 @@ router = APIRouter(prefix="/system", tags=["System"])
 # Store startup time
 startup_time = time.time()
 
+# Metrics are cached briefly so frequent probes don't re-run the psutil/DB/GPU queries
+METRICS_CACHE_SECONDS = 10
+_metrics_cache = {"ts": 0.0, "data": None}
+
+# Prime psutil so cpu_percent(interval=None) reports usage since the previous call instead of sleeping
+psutil.cpu_percent(interval=None)
+
 @router.get("/health/")
 async def health_check():
     """Basic health check endpoint"""
     try:
         # Test database connection
-        conn = db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        conn.close()
+        with get_conn() as conn:
+            conn.execute("SELECT 1").fetchone()
         db_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
@@ -55,8 +59,12 @@ async def get_gpu_status():
 @router.get("/metrics/")
 async def get_system_metrics():
     """Get comprehensive system metrics"""
+    now = time.time()
+    if _metrics_cache["data"] is not None and now - _metrics_cache["ts"] < METRICS_CACHE_SECONDS:
+        return _metrics_cache["data"]
+
     # CPU and Memory
-    cpu_percent = psutil.cpu_percent(interval=1)
+    cpu_percent = psutil.cpu_percent(interval=None)
     memory = psutil.virtual_memory()
     disk = psutil.disk_usage('/')
     
@@ -72,26 +80,24 @@ async def get_system_metrics():
     
     # Database stats
     try:
-        conn = db_connection()
-        cursor = conn.cursor()
-        
-        # Count total rooms
-        cursor.execute("SELECT COUNT(*) as total FROM rooms")
-        total_rooms = cursor.fetchone()["total"]
-        
-        # Count available rooms
-        cursor.execute("SELECT COUNT(*) as available FROM rooms WHERE status = 'Available'")
-        available_rooms = cursor.fetchone()["available"]
-        
-        # Count chat sessions
-        cursor.execute("SELECT COUNT(DISTINCT session_id) as sessions FROM chat_history")
-        total_sessions = cursor.fetchone()["sessions"]
-        
-        # Count total messages
-        cursor.execute("SELECT COUNT(*) as messages FROM chat_history")
-        total_messages = cursor.fetchone()["messages"]
-        
-        conn.close()
+        with get_conn() as conn:
+            cursor = conn.cursor()
+
+            # Count total rooms
+            cursor.execute("SELECT COUNT(*) as total FROM rooms")
+            total_rooms = cursor.fetchone()["total"]
+
+            # Count available rooms
+            cursor.execute("SELECT COUNT(*) as available FROM rooms WHERE status = 'Available'")
+            available_rooms = cursor.fetchone()["available"]
+
+            # Count chat sessions
+            cursor.execute("SELECT COUNT(DISTINCT session_id) as sessions FROM chat_history")
+            total_sessions = cursor.fetchone()["sessions"]
+
+            # Count total messages
+            cursor.execute("SELECT COUNT(*) as messages FROM chat_history")
+            total_messages = cursor.fetchone()["messages"]
         
         db_stats = {
             "total_rooms": total_rooms,
@@ -103,7 +109,7 @@ async def get_system_metrics():
     except Exception as e:
         db_stats = {"error": str(e)}
     
-    return {
+    metrics = {
         "timestamp": datetime.utcnow().isoformat(),
         "uptime_seconds": time.time() - startup_time,
         "system": {
@@ -122,3 +128,5 @@ async def get_system_metrics():
             "rag_chunks": len(model_store.rag_chunks) if model_store.rag_chunks else 0
         }
     }
+    _metrics_cache.update(ts=now, data=metrics)
+    return metrics
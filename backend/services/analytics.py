@@ -3,7 +3,7 @@ import json
 import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from database.models import db_manager
+from database.models import db_manager, sqlite_cutoff
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,6 +52,7 @@ class AnalyticsService:
     
     def get_chat_analytics(self, days: int = 30) -> Dict:
         """Get comprehensive chat analytics"""
+        since = sqlite_cutoff(days=days)
         with self.db_manager.get_connection() as conn:
             # Basic chat metrics
             basic_metrics = conn.execute("""
@@ -61,47 +62,47 @@ class AnalyticsService:
                     AVG(response_time_ms) as avg_response_time,
                     MIN(response_time_ms) as min_response_time,
                     MAX(response_time_ms) as max_response_time
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
-            """.format(days)).fetchone()
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
+            """, (since,)).fetchone()
             
             # Response source distribution
             source_distribution = conn.execute("""
                 SELECT response_source, COUNT(*) as count
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 GROUP BY response_source
                 ORDER BY count DESC
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Hourly activity pattern
             hourly_activity = conn.execute("""
                 SELECT 
                     CAST(strftime('%H', timestamp) AS INTEGER) as hour,
                     COUNT(*) as message_count
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 GROUP BY hour
                 ORDER BY hour
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Intent classification distribution
             intent_distribution = conn.execute("""
                 SELECT intent_classification, COUNT(*) as count
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 AND intent_classification IS NOT NULL
                 GROUP BY intent_classification
                 ORDER BY count DESC
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Average sentiment score
             sentiment_avg = conn.execute("""
                 SELECT AVG(sentiment_score) as avg_sentiment
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 AND sentiment_score IS NOT NULL
-            """.format(days)).fetchone()
+            """, (since,)).fetchone()
             
             return {
                 'basic_metrics': dict(basic_metrics) if basic_metrics else {},
@@ -114,6 +115,7 @@ class AnalyticsService:
     
     def get_booking_analytics(self, days: int = 30) -> Dict:
         """Get comprehensive booking analytics"""
+        since = sqlite_cutoff(days=days)
         with self.db_manager.get_connection() as conn:
             # Revenue and booking metrics
             revenue_metrics = conn.execute("""
@@ -124,17 +126,17 @@ class AnalyticsService:
                     MIN(total_amount) as min_booking_value,
                     MAX(total_amount) as max_booking_value
                 FROM bookings
-                WHERE created_at >= datetime('now', '-{} days')
-            """.format(days)).fetchone()
+                WHERE created_at >= ?
+            """, (since,)).fetchone()
             
             # Booking status distribution
             status_distribution = conn.execute("""
                 SELECT status, COUNT(*) as count
                 FROM bookings
-                WHERE created_at >= datetime('now', '-{} days')
+                WHERE created_at >= ?
                 GROUP BY status
                 ORDER BY count DESC
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Daily booking trend
             daily_bookings = conn.execute("""
@@ -143,10 +145,10 @@ class AnalyticsService:
                     COUNT(*) as booking_count,
                     SUM(total_amount) as daily_revenue
                 FROM bookings
-                WHERE created_at >= datetime('now', '-{} days')
+                WHERE created_at >= ?
                 GROUP BY DATE(created_at)
                 ORDER BY booking_date
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Room type popularity
             room_type_popularity = conn.execute("""
@@ -156,17 +158,17 @@ class AnalyticsService:
                     SUM(b.total_amount) as total_revenue
                 FROM bookings b
                 JOIN rooms r ON b.room_id = r.id
-                WHERE b.created_at >= datetime('now', '-{} days')
+                WHERE b.created_at >= ?
                 GROUP BY r.room_type
                 ORDER BY booking_count DESC
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Average stay duration
             avg_stay = conn.execute("""
                 SELECT AVG(julianday(check_out_date) - julianday(check_in_date)) as avg_stay_days
                 FROM bookings
-                WHERE created_at >= datetime('now', '-{} days')
-            """.format(days)).fetchone()
+                WHERE created_at >= ?
+            """, (since,)).fetchone()
             
             return {
                 'revenue_metrics': dict(revenue_metrics) if revenue_metrics else {},
@@ -179,6 +181,7 @@ class AnalyticsService:
     
     def get_occupancy_analytics(self, days: int = 30) -> Dict:
         """Get room occupancy analytics"""
+        since = sqlite_cutoff(days=days)[:10]  # check_in_date is a plain date
         with self.db_manager.get_connection() as conn:
             # Current occupancy
             current_occupancy = conn.execute("""
@@ -197,11 +200,11 @@ class AnalyticsService:
                     DATE(check_in_date) as date,
                     COUNT(*) as check_ins
                 FROM bookings
-                WHERE check_in_date >= date('now', '-{} days')
+                WHERE check_in_date >= ?
                 AND status IN ('confirmed', 'checked_in')
                 GROUP BY DATE(check_in_date)
                 ORDER BY date
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Floor-wise occupancy
             floor_occupancy = conn.execute("""
@@ -225,6 +228,7 @@ class AnalyticsService:
     
     def get_performance_metrics(self) -> Dict:
         """Get system performance metrics"""
+        since = sqlite_cutoff(days=1)
         with self.db_manager.get_connection() as conn:
             # Response time metrics from last 24 hours
             response_time_metrics = conn.execute("""
@@ -234,10 +238,10 @@ class AnalyticsService:
                     MAX(response_time_ms) as max_response_time,
                     COUNT(CASE WHEN response_time_ms > 5000 THEN 1 END) as slow_responses,
                     COUNT(*) as total_responses
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-1 day')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 AND response_time_ms IS NOT NULL
-            """).fetchone()
+            """, (since,)).fetchone()
             
             # Error rate from system logs
             error_rate = conn.execute("""
@@ -245,9 +249,9 @@ class AnalyticsService:
                     COUNT(CASE WHEN log_level = 'ERROR' THEN 1 END) as error_count,
                     COUNT(CASE WHEN log_level = 'WARNING' THEN 1 END) as warning_count,
                     COUNT(*) as total_logs
-                FROM system_logs
-                WHERE timestamp >= datetime('now', '-1 day')
-            """).fetchone()
+                FROM telemetry.system_logs
+                WHERE timestamp >= ?
+            """, (since,)).fetchone()
             
             return {
                 'response_time_metrics': dict(response_time_metrics) if response_time_metrics else {},
@@ -259,18 +263,23 @@ class AnalyticsService:
         """Generate comprehensive daily report"""
         if not target_date:
             target_date = datetime.now().strftime('%Y-%m-%d')
+        # Half-open [day, next_day) ranges instead of DATE(column) = ?, so the indexes apply
+        day = {
+            'day': target_date,
+            'next_day': (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        }
         
         with self.db_manager.get_connection() as conn:
             # Daily summary
             daily_summary = conn.execute("""
                 SELECT 
-                    (SELECT COUNT(*) FROM chat_history WHERE DATE(timestamp) = ?) as total_chats,
-                    (SELECT COUNT(DISTINCT session_id) FROM chat_history WHERE DATE(timestamp) = ?) as unique_sessions,
-                    (SELECT COUNT(*) FROM bookings WHERE DATE(created_at) = ?) as new_bookings,
-                    (SELECT SUM(total_amount) FROM bookings WHERE DATE(created_at) = ?) as daily_revenue,
-                    (SELECT COUNT(*) FROM bookings WHERE DATE(check_in_date) = ?) as check_ins,
-                    (SELECT COUNT(*) FROM bookings WHERE DATE(check_out_date) = ?) as check_outs
-            """, (target_date, target_date, target_date, target_date, target_date, target_date)).fetchone()
+                    (SELECT COUNT(*) FROM telemetry.chat_history WHERE timestamp >= :day AND timestamp < :next_day) as total_chats,
+                    (SELECT COUNT(DISTINCT session_id) FROM telemetry.chat_history WHERE timestamp >= :day AND timestamp < :next_day) as unique_sessions,
+                    (SELECT COUNT(*) FROM bookings WHERE created_at >= :day AND created_at < :next_day) as new_bookings,
+                    (SELECT SUM(total_amount) FROM bookings WHERE created_at >= :day AND created_at < :next_day) as daily_revenue,
+                    (SELECT COUNT(*) FROM bookings WHERE check_in_date >= :day AND check_in_date < :next_day) as check_ins,
+                    (SELECT COUNT(*) FROM bookings WHERE check_out_date >= :day AND check_out_date < :next_day) as check_outs
+            """, day).fetchone()
             
             return {
                 'date': target_date,
@@ -280,6 +289,7 @@ class AnalyticsService:
     
     def get_user_behavior_insights(self, days: int = 30) -> Dict:
         """Get insights into user behavior patterns"""
+        since = sqlite_cutoff(days=days)
         with self.db_manager.get_connection() as conn:
             # Session duration analysis
             session_duration = conn.execute("""
@@ -287,11 +297,11 @@ class AnalyticsService:
                     session_id,
                     COUNT(*) as message_count,
                     (julianday(MAX(timestamp)) - julianday(MIN(timestamp))) * 24 * 60 as duration_minutes
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 GROUP BY session_id
                 HAVING COUNT(*) > 1
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             # Common question patterns
             common_patterns = conn.execute("""
@@ -299,13 +309,13 @@ class AnalyticsService:
                     intent_classification,
                     COUNT(*) as frequency,
                     AVG(response_time_ms) as avg_response_time
-                FROM chat_history
-                WHERE timestamp >= datetime('now', '-{} days')
+                FROM telemetry.chat_history
+                WHERE timestamp >= ?
                 AND intent_classification IS NOT NULL
                 GROUP BY intent_classification
                 ORDER BY frequency DESC
                 LIMIT 10
-            """.format(days)).fetchall()
+            """, (since,)).fetchall()
             
             avg_session_duration = sum(row[2] for row in session_duration) / len(session_duration) if session_duration else 0
             avg_messages_per_session = sum(row[1] for row in session_duration) / len(session_duration) if session_duration else 0
@@ -1,28 +1,37 @@
 # services/auth.py
 import hashlib
+import hmac
 import secrets
+import bcrypt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Tuple
-from database.operations import db_connection
+from database.operations import get_conn
 
 def hash_password(password: str) -> str:
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password using bcrypt"""
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=12)).decode()
+
+def _is_legacy_hash(hashed_password: str) -> bool:
+    # Accounts created before the bcrypt switch store an unsalted SHA-256 hex digest
+    return not hashed_password.startswith('$2')
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return hash_password(password) == hashed_password
+    if _is_legacy_hash(hashed_password):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), hashed_password)
+    return bcrypt.checkpw(password.encode(), hashed_password.encode())
 
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Authenticate user credentials"""
-    conn = db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
-    conn.close()
+    with get_conn() as conn:
+        user = conn.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,)).fetchone()
     
     if user and verify_password(password, user['password_hash']):
+        if _is_legacy_hash(user['password_hash']):
+            # Re-hash on the first successful login, while the plaintext is at hand
+            with get_conn() as conn:
+                conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hash_password(password), user['id']))
+                conn.commit()
         return {
             "user_id": str(user['id']),
             "username": user['username'],
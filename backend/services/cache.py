@@ -150,7 +150,7 @@ class CacheService:
     def __init__(self):
         self.memory_cache = InMemoryCache(max_size=2000, default_ttl=3600)
         self.query_cache = InMemoryCache(max_size=500, default_ttl=300)  # 5 minutes for queries
-        self.ml_cache = InMemoryCache(max_size=100, default_ttl=1800)    # 30 minutes for ML results
+        self.ml_cache = InMemoryCache(max_size=512, default_ttl=1800)    # 30 minutes for ML results
         self.session_cache = InMemoryCache(max_size=1000, default_ttl=7200)  # 2 hours for sessions
     
     def cache_chatbot_response(self, user_input: str, response: str, 
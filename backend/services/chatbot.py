@@ -1,71 +1,182 @@
 # services/chatbot.py
+import asyncio
 import logging
 import uuid
-from typing import Tuple
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-# Handle imports with error handling
-try:
-    from laonlp.tokenize import word_tokenize
-except ImportError:
-    word_tokenize = None
-
-from database.operations import db_connection
-from services.ml_models import get_rag_context, generate_llm_answer_sync
+from config.settings import CONFIG
+from database.operations import log_chat_messages
+from services.ml_models import (
+    model_store, retrieval_queue, generation_queue, tokenize_query,
+    AsyncTextStreamer, strip_stop_strings
+)
 from services.conversation import (
     convo_manager, detect_booking_intent, handle_booking_request,
     handle_room_selection, handle_date_selection, handle_booking_confirmation
 )
 
-def save_chat_to_db(session_id: str, role: str, content: str):
-    """Save chat message to database"""
-    conn = db_connection()
-    cursor = conn.cursor()
-    message_id = str(uuid.uuid4())
-    cursor.execute("INSERT INTO chat_history (message_id, session_id, role, content) VALUES (?, ?, ?, ?)", 
-                   (message_id, session_id, role, content))
-    conn.commit()
-    conn.close()
+HISTORY_BATCH_SIZE = 32
+HISTORY_FLUSH_WAIT_SECONDS = 0.5  # How long a partial batch waits for more rows
+
+# Queued by stop_history_writer: the writer flushes what it holds and exits
+_HISTORY_STOP = None
+
+# Chat rows waiting for the background writer; None until the writer is started
+history_queue: Optional[asyncio.Queue] = None
+history_writer_task: Optional[asyncio.Task] = None
+
+def chat_row(session_id: str, role: str, content: str) -> Tuple[str, str, str, str, str]:
+    """Build a chat_history row, stamped now so the user/assistant order survives batching"""
+    return (str(uuid.uuid4()), session_id, role, content, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'))
+
+def save_chat_rows(rows: List[Tuple[str, str, str, str, str]]):
+    """Queue chat rows for the background writer (falls back to a direct write)"""
+    if history_queue is None:
+        log_chat_messages(rows)
+    else:
+        # Rows queued together are drained into the same executemany transaction
+        for row in rows:
+            history_queue.put_nowait(row)
+
+async def history_writer():
+    """Drain queued chat rows and write them in batches off the request path"""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        batch = []
+        row = await history_queue.get()
+        # Let a partial batch fill for a moment, so quiet periods still share one commit
+        deadline = loop.time() + HISTORY_FLUSH_WAIT_SECONDS
+        while True:
+            if row is _HISTORY_STOP:
+                stopping = True
+                break
+            batch.append(row)
+            if len(batch) >= HISTORY_BATCH_SIZE:
+                break
+            if history_queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(history_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                row = history_queue.get_nowait()
+        if not batch:
+            continue
+        try:
+            await asyncio.to_thread(log_chat_messages, batch)
+        except Exception as e:
+            logging.error(f"Failed to write {len(batch)} chat history rows: {e}")
+
+def start_history_writer():
+    global history_queue, history_writer_task
+    history_queue = asyncio.Queue()
+    history_writer_task = asyncio.create_task(history_writer())
+
+async def stop_history_writer():
+    """Stop the writer and flush anything still queued"""
+    global history_queue, history_writer_task
+    if history_writer_task is None:
+        return
+    # A sentinel rather than cancel(), so the batch the writer is filling gets written too
+    history_queue.put_nowait(_HISTORY_STOP)
+    await history_writer_task
+    # Rows queued behind the sentinel while the writer finished
+    remaining = []
+    while not history_queue.empty():
+        remaining.append(history_queue.get_nowait())
+    history_queue, history_writer_task = None, None
+    if remaining:
+        log_chat_messages(remaining)
+
+def answer_from_conversation_flow(user_input: str, session_id: str) -> Optional[Tuple[str, str]]:
+    """Answer booking-flow turns directly; None means the turn goes to RAG + LLM"""
+    # Get current conversation state
+    current_state = convo_manager.get_state(session_id)
+    
+    # Handle different conversation states
+    if current_state == "AWAITING_ROOM_CHOICE":
+        return handle_room_selection(user_input, session_id)
+    elif current_state == "AWAITING_DATES":
+        return handle_date_selection(user_input, session_id)
+    elif current_state == "AWAITING_BOOKING_CONFIRMATION":
+        return handle_booking_confirmation(user_input, session_id)
+    
+    # Normal conversation - check for booking intent
+    if detect_booking_intent(tokenize_query(user_input)):
+        return handle_booking_request(session_id)
+    return None
 
 async def generate_orchestrated_answer(user_input: str, session_id: str) -> Tuple[str, str]:
     """
     Main orchestration function that handles conversation flow
     """
+    # The user row is stamped now but written together with the reply, one transaction per turn
+    user_row = chat_row(session_id, "user", user_input)
     try:
-        # Save user input to database
-        save_chat_to_db(session_id, "user", user_input)
-        
-        # Get current conversation state
-        current_state = convo_manager.get_state(session_id)
-        
-        # Handle different conversation states
-        if current_state == "AWAITING_ROOM_CHOICE":
-            reply, source = handle_room_selection(user_input, session_id)
-        elif current_state == "AWAITING_DATES":
-            reply, source = handle_date_selection(user_input, session_id)
-        elif current_state == "AWAITING_BOOKING_CONFIRMATION":
-            reply, source = handle_booking_confirmation(user_input, session_id)
+        # Booking DB calls, tokenization and retriever encodes run off the event loop
+        answer = await asyncio.to_thread(answer_from_conversation_flow, user_input, session_id)
+        if answer is not None:
+            reply, source = answer
         else:
-            # Normal conversation - check for booking intent
-            if word_tokenize:
-                tokenized_query = " ".join(word_tokenize(user_input))
-            else:
-                tokenized_query = user_input  # Fallback if laonlp not available
-            
-            if detect_booking_intent(tokenized_query):
-                reply, source = handle_booking_request(session_id)
-            else:
-                # Use RAG + LLM for general queries
-                context = get_rag_context(user_input)
-                reply = generate_llm_answer_sync(user_input, context)
-                source = "LLM_WITH_RAG"
+            # Use RAG + LLM for general queries
+            context = await retrieval_queue.submit(user_input)
+            reply = await generation_queue.submit(user_input, context)
+            source = "LLM_WITH_RAG"
         
-        # Save assistant response to database
-        save_chat_to_db(session_id, "assistant", reply)
+        # Save both sides of the turn to the database
+        save_chat_rows([user_row, chat_row(session_id, "assistant", reply)])
         
         return reply, source
         
     except Exception as e:
         logging.error(f"Error in orchestrated answer generation: {e}")
         error_reply = "ຂໍອະໄພ, ເກີດຂໍ້ຜິດພາດ. ກະລຸນາລອງຖາມຄຳຖາມໃໝ່."
-        save_chat_to_db(session_id, "assistant", error_reply)
+        save_chat_rows([user_row, chat_row(session_id, "assistant", error_reply)])
         return error_reply, "ERROR"
+
+async def stream_orchestrated_answer(user_input: str, session_id: str) -> AsyncIterator[Dict]:
+    """
+    Same flow as generate_orchestrated_answer, but yields {"token": ...} events while the
+    LLM decodes and a final {"done": True, "source": ...} event
+    """
+    user_row = chat_row(session_id, "user", user_input)
+    reply, source, decoded = "", "LLM_WITH_RAG", ""
+    try:
+        answer = await asyncio.to_thread(answer_from_conversation_flow, user_input, session_id)
+        if answer is not None:
+            reply, source = answer
+            yield {"token": reply}
+        else:
+            context = await retrieval_queue.submit(user_input)
+            streamer = AsyncTextStreamer(model_store.tokenizer, asyncio.get_running_loop())
+            reply_task = asyncio.create_task(generation_queue.submit(user_input, context, streamer))
+
+            # Hold back enough characters that a stop string split across tokens is never sent
+            holdback = max(len(stop) for stop in CONFIG.STOP_STRINGS) - 1
+            sent = 0
+            while (text := await streamer.queue.get()) is not None:
+                decoded += text
+                visible = strip_stop_strings(decoded)
+                safe_end = len(visible) if len(visible) < len(decoded.lstrip()) else len(visible) - holdback
+                if safe_end > sent:
+                    yield {"token": visible[sent:safe_end]}
+                    sent = safe_end
+
+            reply = await reply_task
+            if len(reply) > sent:
+                yield {"token": reply[sent:]}
+        yield {"done": True, "source": source, "session_id": session_id}
+
+    except Exception as e:
+        logging.error(f"Error in streamed answer generation: {e}")
+        reply, source = "ຂໍອະໄພ, ເກີດຂໍ້ຜິດພາດ. ກະລຸນາລອງຖາມຄຳຖາມໃໝ່.", "ERROR"
+        yield {"token": reply}
+        yield {"done": True, "source": source, "session_id": session_id}
+    finally:
+        # Persist whatever was produced, even if the client disconnected mid-stream
+        save_chat_rows([user_row, chat_row(session_id, "assistant", reply or strip_stop_strings(decoded))])
@@ -1,16 +1,17 @@
 # services/conversation.py
 import re
 import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 
 # These imports will be available when packages are installed
 try:
-    from sentence_transformers import util
     from laonlp.tokenize import word_tokenize
 except ImportError:
     # Handle import errors gracefully during development
-    util = None
     word_tokenize = None
 
 from config.settings import CONFIG, ROOM_NUMBERS
@@ -18,7 +19,7 @@ from database.operations import get_available_rooms_from_db, get_room_details_fr
 
 # Import model_store with error handling
 try:
-    from services.ml_models import model_store
+    from services.ml_models import model_store, encode_query
 except ImportError:
     # Create a dummy model_store for development
     class DummyModelStore:
@@ -26,39 +27,71 @@ except ImportError:
             self.retriever = None
             self.booking_intent_embedding = None
     model_store = DummyModelStore()
+    encode_query = None
 
 class ConversationManager:
-    def __init__(self):
-        self.states: Dict[str, str] = {}
+    def __init__(self, max_sessions: int = CONFIG.MAX_CONVERSATION_SESSIONS):
+        # Least recently touched session first; the oldest is evicted once max_sessions is exceeded
+        self.states: "OrderedDict[str, str]" = OrderedDict()
         self.pending_bookings: Dict[str, Dict] = {}
+        self.max_sessions = max_sessions
+        # Handlers run in worker threads via asyncio.to_thread
+        self.lock = threading.Lock()
 
     def get_state(self, session_id: str) -> str: 
-        return self.states.get(session_id, "NORMAL")
+        with self.lock:
+            state = self.states.get(session_id)
+            if state is None:
+                return "NORMAL"
+            self.states.move_to_end(session_id)
+            return state
     
     def set_state(self, session_id: str, state: str, booking_info: Optional[Dict] = None):
         logging.info(f"Session '{session_id}' state changed to: {state}")
-        self.states[session_id] = state
-        if booking_info is not None: 
-            self.pending_bookings[session_id] = booking_info
+        with self.lock:
+            self.states[session_id] = state
+            self.states.move_to_end(session_id)
+            if booking_info is not None: 
+                self.pending_bookings[session_id] = booking_info
+            while len(self.states) > self.max_sessions:
+                evicted, _ = self.states.popitem(last=False)
+                self.pending_bookings.pop(evicted, None)
     
     def get_pending_booking(self, session_id: str) -> Optional[Dict]: 
         return self.pending_bookings.get(session_id)
     
     def clear_session(self, session_id: str) -> bool:
-        cleared = False
-        if session_id in self.states: 
-            del self.states[session_id]
-            cleared = True
-        if session_id in self.pending_bookings: 
-            del self.pending_bookings[session_id]
-            cleared = True
+        with self.lock:
+            cleared = self.states.pop(session_id, None) is not None
+            cleared = self.pending_bookings.pop(session_id, None) is not None or cleared
         return cleared
 
 # Global conversation manager
 convo_manager = ConversationManager()
 
+# Room numbers not embedded in a longer number, so "ຫ້ອງ101" matches but "1010" does not
+ROOM_RX = re.compile(r'(?<!\d)(' + '|'.join(map(re.escape, ROOM_NUMBERS)) + r')(?!\d)')
+
+def compile_keywords(keywords) -> re.Pattern:
+    """One case-insensitive alternation regex so a keyword check is a single C-level scan with no lower() copy"""
+    return re.compile('|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)), re.IGNORECASE)
+
+def refresh_keyword_patterns():
+    """Recompile keyword patterns; call after CONFIG keyword sets are changed at runtime"""
+    global BOOKING_INTENT_RX, CONFIRMATION_RX, PRICE_INQUIRY_RX
+    BOOKING_INTENT_RX = compile_keywords(CONFIG.BOOKING_INTENT_KEYWORDS)
+    CONFIRMATION_RX = compile_keywords(CONFIG.CONFIRMATION_KEYWORDS)
+    PRICE_INQUIRY_RX = compile_keywords(CONFIG.PRICE_INQUIRY_KEYWORDS)
+
+refresh_keyword_patterns()
+
+# Date patterns are compiled once at import instead of on every parse_dates call
+DATE_RX = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})')
+DURATION_RX = re.compile(r'(\d+)\s*(day|night|ຄືນ|ມື້)')
+TOMORROW_RX = re.compile(r'tomorrow|ມື້ອື່ນ')
+
 def parse_dates(text: str) -> Optional[Tuple[datetime, datetime]]:
-    matches = re.findall(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', text)
+    matches = DATE_RX.findall(text)
     if len(matches) >= 2:
         try:
             date1 = datetime.strptime(f"{matches[0][0]}-{matches[0][1]}-{matches[0][2]}", '%d-%m-%Y').date()
@@ -66,30 +99,38 @@ def parse_dates(text: str) -> Optional[Tuple[datetime, datetime]]:
             return (min(date1, date2), max(date1, date2))
         except ValueError: 
             pass
-    if "tomorrow" in text or "ມື້ອື່ນ" in text:
+    if TOMORROW_RX.search(text):
         start_date = datetime.now() + timedelta(days=1)
-        duration_match = re.search(r'(\d+)\s*(day|night|ຄືນ|ມື້)', text)
+        duration_match = DURATION_RX.search(text)
         if duration_match:
             days = int(duration_match.group(1))
             end_date = start_date + timedelta(days=days)
             return start_date.date(), end_date.date()
     return None
 
+@lru_cache(maxsize=1024)
+def intent_score(tokenized_query: str) -> float:
+    """Cosine similarity to the booking intent; clear with intent_score.cache_clear() on model reload"""
+    query_embedding = encode_query(tokenized_query)
+    # Both embeddings are unit-normalized, so the dot product is the cosine similarity
+    return (query_embedding @ model_store.booking_intent_embedding).item()
+
 def detect_booking_intent(tokenized_query: str) -> bool:
-    if any(keyword in tokenized_query.lower() for keyword in CONFIG.BOOKING_INTENT_KEYWORDS): 
+    if BOOKING_INTENT_RX.search(tokenized_query): 
         return True
+    # Greetings and one-word replies are never bookings without a keyword, so skip the encoder
+    if len(tokenized_query.split()) < CONFIG.BOOKING_MIN_TOKENS:
+        return False
     try:
-        if model_store.retriever and model_store.booking_intent_embedding:
-            query_embedding = model_store.retriever.encode(tokenized_query, convert_to_tensor=True, device=model_store.device)
-            score = util.cos_sim(query_embedding, model_store.booking_intent_embedding)[0][0].item()
-            return score > CONFIG.BOOKING_SIMILARITY_THRESHOLD
+        if model_store.retriever is not None and model_store.booking_intent_embedding is not None:
+            return intent_score(tokenized_query) > CONFIG.BOOKING_SIMILARITY_THRESHOLD
     except:
         pass
     return False
 
 def detect_price_inquiry(user_input: str) -> bool:
     """Detect if user is asking about price"""
-    return any(keyword in user_input.lower() for keyword in CONFIG.PRICE_INQUIRY_KEYWORDS)
+    return PRICE_INQUIRY_RX.search(user_input) is not None
 
 def handle_booking_request(session_id: str) -> Tuple[str, str]:
     available_rooms = get_available_rooms_from_db()
@@ -105,7 +146,8 @@ def handle_room_selection(user_input: str, session_id: str) -> Tuple[str, str]:
     if detect_price_inquiry(user_input):
         return "ກະລຸນາເລືອກໝາຍເລກຫ້ອງກ່ອນ. ຂໍ້ມູນລາຄາໄດ້ແຈ້ງໄວ້ແລ້ວຕອນເລີ່ມຕົ້ນ.", "FOCUS_ON_BOOKING"
     
-    selected_room = next((word for word in user_input.split() if word in ROOM_NUMBERS), None)
+    room_match = ROOM_RX.search(user_input)
+    selected_room = room_match.group(1) if room_match else None
     if not selected_room: 
         return "ຂໍອະໄພ, ຂ້ອຍບໍ່ເຫັນໝາຍເລກຫ້ອງທີ່ຖືກຕ້ອງ. ກະລຸນາລອງໃໝ່.", "INVALID_ROOM"
     room_details = get_room_details_from_db(selected_room)
@@ -142,7 +184,7 @@ def handle_booking_confirmation(user_input: str, session_id: str) -> Tuple[str,
     if detect_price_inquiry(user_input):
         return "ກະລຸນາຕອບ ແມ່ນ ຫຼື ບໍ່ ສຳລັບການຢືນຢັນການຈອງກ່ອນ. ຂໍ້ມູນລາຄາໄດ້ແຈ້ງໄວ້ແລ້ວຕອນເລີ່ມຕົ້ນ.", "FOCUS_ON_BOOKING"
     
-    if any(keyword in user_input.lower() for keyword in CONFIG.CONFIRMATION_KEYWORDS):
+    if CONFIRMATION_RX.search(user_input):
         success = book_room_in_db(pending_booking['room'], pending_booking['start_date'], pending_booking['end_date'], f"Booked via Chatbot session {session_id}")
         convo_manager.clear_session(session_id)
         if success: 
@@ -1,14 +1,37 @@
 # services/ml_models.py
 import os
+import json
+import asyncio
 import torch
 import gc
 import logging
-from typing import List, Optional
-from sentence_transformers import SentenceTransformer, util
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+import numpy as np
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, StaticCache, TextStreamer
 from peft import PeftModel
 from laonlp.tokenize import word_tokenize
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
 from config.settings import CONFIG
+from services.cache import cache_service
+
+SYSTEM_PROMPT = (
+    "You are Sailor2, an AI assistant for Vang Vieng, Laos tourism and hotel services. "
+    "Respond in Lao language (ພາສາລາວ) with helpful, professional information about:\n"
+    "- Hotel bookings and accommodations\n"
+    "- Tourist attractions in Vang Vieng\n"
+    "- Restaurants and local food\n"
+    "- Transportation and travel tips\n"
+    "- Adventure activities\n"
+    "Keep responses concise and friendly."
+)
 
 class ModelStore:
     def __init__(self):
@@ -19,13 +42,26 @@ class ModelStore:
         self.booking_intent_embedding = None
         self.rag_chunks: List[str] = []
         self.rag_embeddings: Optional[torch.Tensor] = None
+        self.retriever_device = None
+        self.rag_index = None
+        self.static_cache: Optional[StaticCache] = None
+        # Set when forward is compiled: the module and its uncompiled forward, for variable shapes
+        self.compiled_module = None
+        self.eager_forward = None
+        self.system_prompt_ids: Optional[torch.Tensor] = None
+        self.system_prompt_kv: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None
+        self.prompt_fragment_ids: Dict[str, List[int]] = {}
         self.device = None
 
 # Global model store
 model_store = ModelStore()
 
 def cleanup_gpu_memory():
-    """Clean up GPU memory to prevent OOM errors"""
+    """Release cached GPU blocks back to the driver.
+
+    Only call this for OOM recovery or explicit admin cleanup - on the request
+    path it defeats the caching allocator and forces fresh cudaMalloc calls.
+    """
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
         torch.cuda.synchronize()
@@ -70,6 +106,137 @@ def get_best_checkpoint(base_dir):
     
     return None
 
+def load_awq_generator(awq_dir: str):
+    """Load the offline merged + AWQ-quantized LLM with fused INT4 kernels"""
+    from awq import AutoAWQForCausalLM
+
+    logging.info(f"Loading AWQ-quantized LLM from: {awq_dir}")
+    # The fused KV cache is allocated once here and can't grow, so size it for the longest
+    # prompt + answer and the largest generate() batch this server issues
+    awq_model = AutoAWQForCausalLM.from_quantized(
+        awq_dir, fuse_layers=True, safetensors=True,
+        max_seq_len=CONFIG.MAX_INPUT_LENGTH + CONFIG.MAX_NEW_TOKENS,
+        batch_size=CONFIG.BATCH_SIZE
+    )
+
+    # LoRA is already merged into the quantized weights, so there is no adapter to wrap.
+    # Fused attention manages its own KV cache, so no StaticCache / torch.compile here.
+    model_store.generator_llm = awq_model.model
+    model_store.tokenizer = AutoTokenizer.from_pretrained(awq_dir, trust_remote_code=True)
+    model_store.static_cache = None
+
+    if model_store.tokenizer.pad_token is None:
+        model_store.tokenizer.pad_token = model_store.tokenizer.eos_token
+
+def load_peft_generator():
+    """Load the base LLM in bnb 4-bit and apply the fine-tuned LoRA checkpoint"""
+    # Load fine-tuned model with fallback paths
+    best_checkpoint = None
+    for checkpoint_dir in [CONFIG.FINETUNED_OUTPUT_DIR, CONFIG.LEGACY_FINETUNED_OUTPUT_DIR]:
+        best_checkpoint = get_best_checkpoint(checkpoint_dir)
+        if best_checkpoint:
+            break
+    
+    if not best_checkpoint:
+        raise FileNotFoundError(f"No fine-tuned model checkpoint found in {CONFIG.FINETUNED_OUTPUT_DIR} or {CONFIG.LEGACY_FINETUNED_OUTPUT_DIR}.")
+
+    logging.info(f"Loading fine-tuned LLM from: {best_checkpoint}")
+
+    # AGGRESSIVE quantization for mobile GPU
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_use_double_quant=True,  # Double quantization for extra compression
+        bnb_4bit_quant_storage=torch.uint8  # Use uint8 for storage
+    )
+
+    # Load with minimal memory footprint
+    base_model = AutoModelForCausalLM.from_pretrained(
+        CONFIG.BASE_LLM_MODEL,
+        quantization_config=bnb_config,
+        device_map="auto",  # Let transformers handle device mapping
+        trust_remote_code=True,
+        torch_dtype=torch.float16,
+        low_cpu_mem_usage=True  # Reduce CPU memory usage during loading
+    )
+
+    peft_model = PeftModel.from_pretrained(base_model, best_checkpoint)
+    if CONFIG.MERGE_LORA_ON_LOAD:
+        # Fold LoRA into the base weights so decode skips the extra adapter matmuls per projection.
+        # With 4-bit weights the merge is re-quantized (small rounding error); AWQ checkpoints merge offline.
+        model_store.generator_llm = peft_model.merge_and_unload()
+        logging.info("🔗 LoRA adapters merged into base weights.")
+    else:
+        model_store.generator_llm = peft_model
+    model_store.tokenizer = AutoTokenizer.from_pretrained(CONFIG.BASE_LLM_MODEL, trust_remote_code=True)
+
+    if model_store.tokenizer.pad_token is None:
+        model_store.tokenizer.pad_token = model_store.tokenizer.eos_token
+
+    # Pre-allocate a fixed-shape KV cache once and reuse it for every request
+    model_store.static_cache = StaticCache(
+        config=base_model.config,
+        batch_size=1,
+        max_cache_len=CONFIG.MAX_INPUT_LENGTH + CONFIG.MAX_NEW_TOKENS,
+        device=model_store.device,
+        dtype=torch.float16
+    )
+
+    # Static shapes let torch.compile capture the decode step as a CUDA graph
+    if CONFIG.TORCH_COMPILE_ENABLED and torch.cuda.is_available():
+        llm = model_store.generator_llm
+        if isinstance(llm, PeftModel):
+            llm = llm.get_base_model()
+        model_store.compiled_module, model_store.eager_forward = llm, llm.forward
+        llm.forward = torch.compile(llm.forward, mode="reduce-overhead", fullgraph=False, dynamic=False)
+        logging.info("⚡ Decode step compiled with torch.compile (reduce-overhead).")
+
+def prefill_system_prompt():
+    """Tokenize the fixed system prompt once and snapshot its prefilled KV cache"""
+    model_store.system_prompt_ids = model_store.tokenizer(
+        f"System: {SYSTEM_PROMPT}\n\n",
+        return_tensors="pt"
+    ).input_ids.to(model_store.device)
+    model_store.system_prompt_kv = None
+    # The fixed template pieces around context and query, tokenized once. They end right
+    # before a space-led word, which the BPE pre-tokenizer splits on anyway, so joining
+    # the ids gives the same tokens as tokenizing the whole formatted string
+    model_store.prompt_fragment_ids = {
+        name: model_store.tokenizer(text, add_special_tokens=False).input_ids
+        for name, text in (("context", "Context:"), ("human", "...\n\nHuman:"), ("assistant", "\n\nAssistant: "))
+    }
+
+    cache = model_store.static_cache
+    if cache is None:
+        return
+
+    cache.reset()
+    with torch.no_grad():
+        model_store.generator_llm(
+            input_ids=model_store.system_prompt_ids,
+            past_key_values=cache,
+            use_cache=True
+        )
+
+    prefix_len = model_store.system_prompt_ids.shape[-1]
+    model_store.system_prompt_kv = [
+        (key[:, :, :prefix_len].clone(), value[:, :, :prefix_len].clone())
+        for key, value in zip(cache.key_cache, cache.value_cache)
+    ]
+    logging.info(f"System prompt prefilled into KV cache ({prefix_len} tokens).")
+
+def restore_system_prompt_cache():
+    """Reset the shared static cache and copy the system prompt prefix back in"""
+    cache = model_store.static_cache
+    cache.reset()
+    if model_store.system_prompt_kv is None:
+        return
+    prefix_len = model_store.system_prompt_ids.shape[-1]
+    for layer_idx, (key, value) in enumerate(model_store.system_prompt_kv):
+        cache.key_cache[layer_idx][:, :, :prefix_len].copy_(key)
+        cache.value_cache[layer_idx][:, :, :prefix_len].copy_(value)
+
 def load_all_models_and_data():
     if model_store.models_loaded: 
         return
@@ -80,84 +247,53 @@ def load_all_models_and_data():
         model_store.device = "cuda" if torch.cuda.is_available() else "cpu"
 
         if torch.cuda.is_available():
-            # Set memory fraction for mobile GPU
-            torch.cuda.set_per_process_memory_fraction(0.85)  # Use 85% of VRAM
             logging.info(f"GPU: {torch.cuda.get_device_name()}")
             logging.info(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1e9:.1f} GB")
 
-        cleanup_gpu_memory()
-
         # Load smaller retriever model first
-        logging.info(f"Loading retriever model: {CONFIG.RETRIEVER_MODEL}")
-        model_store.retriever = SentenceTransformer(CONFIG.RETRIEVER_MODEL, device=model_store.device)
-        check_gpu_memory()
-
-        # Load knowledge base with fallback paths
-        knowledge_base_path = None
-        for path in [CONFIG.KNOWLEDGE_BASE_PATH, CONFIG.LEGACY_KNOWLEDGE_BASE_PATH]:
-            if os.path.exists(path):
-                knowledge_base_path = path
-                break
-        
-        if knowledge_base_path:
-            logging.info(f"Loading knowledge base from: {knowledge_base_path}")
-            kb_data = torch.load(knowledge_base_path, map_location=model_store.device)
-            model_store.rag_chunks = kb_data['chunks']
-            model_store.rag_embeddings = kb_data['embeddings'].to(model_store.device)
-            logging.info(f"✅ Knowledge base loaded with {len(model_store.rag_chunks)} chunks.")
-            check_gpu_memory()
+        logging.info(f"Loading retriever model: {CONFIG.RETRIEVER_MODEL} (backend: {CONFIG.RETRIEVER_BACKEND})")
+        if CONFIG.RETRIEVER_BACKEND == "onnx":
+            # INT8 ONNX on CPU: short LaBSE queries are memory-bound and leave VRAM for the LLM
+            model_store.retriever_device = "cpu"
+            model_store.retriever = SentenceTransformer(
+                CONFIG.RETRIEVER_MODEL,
+                device=model_store.retriever_device,
+                backend="onnx",
+                model_kwargs={"file_name": CONFIG.RETRIEVER_ONNX_FILE}
+            )
+        elif model_store.device == "cuda":
+            # FP16 weights: half the VRAM and tensor-core matmuls; top-k ranking is unaffected
+            model_store.retriever_device = model_store.device
+            model_store.retriever = SentenceTransformer(
+                CONFIG.RETRIEVER_MODEL,
+                device=model_store.retriever_device,
+                model_kwargs={"torch_dtype": torch.float16}
+            )
         else:
-            logging.warning(f"Knowledge base file not found. RAG will be disabled.")
-            logging.info(f"Searched paths: {CONFIG.KNOWLEDGE_BASE_PATH}, {CONFIG.LEGACY_KNOWLEDGE_BASE_PATH}")
-
-        # Load fine-tuned model with fallback paths
-        best_checkpoint = None
-        for checkpoint_dir in [CONFIG.FINETUNED_OUTPUT_DIR, CONFIG.LEGACY_FINETUNED_OUTPUT_DIR]:
-            best_checkpoint = get_best_checkpoint(checkpoint_dir)
-            if best_checkpoint:
-                break
-        
-        if not best_checkpoint:
-            raise FileNotFoundError(f"No fine-tuned model checkpoint found in {CONFIG.FINETUNED_OUTPUT_DIR} or {CONFIG.LEGACY_FINETUNED_OUTPUT_DIR}.")
-
-        logging.info(f"Loading fine-tuned LLM from: {best_checkpoint}")
-
-        # AGGRESSIVE quantization for mobile GPU
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_use_double_quant=True,  # Double quantization for extra compression
-            bnb_4bit_quant_storage=torch.uint8  # Use uint8 for storage
-        )
-
-        # Load with minimal memory footprint
-        base_model = AutoModelForCausalLM.from_pretrained(
-            CONFIG.BASE_LLM_MODEL,
-            quantization_config=bnb_config,
-            device_map="auto",  # Let transformers handle device mapping
-            trust_remote_code=True,
-            torch_dtype=torch.float16,
-            low_cpu_mem_usage=True,  # Reduce CPU memory usage during loading
-            use_cache=False  # Disable KV cache to save memory
-        )
+            model_store.retriever_device = model_store.device
+            model_store.retriever = torch.quantization.quantize_dynamic(
+                SentenceTransformer(CONFIG.RETRIEVER_MODEL, device=model_store.retriever_device),
+                {torch.nn.Linear},
+                dtype=torch.qint8
+            )
+        check_gpu_memory()
 
-        model_store.generator_llm = PeftModel.from_pretrained(base_model, best_checkpoint)
-        model_store.tokenizer = AutoTokenizer.from_pretrained(CONFIG.BASE_LLM_MODEL, trust_remote_code=True)
+        load_knowledge_base()
 
-        if model_store.tokenizer.pad_token is None:
-            model_store.tokenizer.pad_token = model_store.tokenizer.eos_token
+        if os.path.isdir(CONFIG.AWQ_MODEL_DIR):
+            load_awq_generator(CONFIG.AWQ_MODEL_DIR)
+        else:
+            load_peft_generator()
+        prefill_system_prompt()
 
         logging.info("✅ Fine-tuned LLM loaded successfully.")
         check_gpu_memory()
 
         # Create booking intent embedding
         booking_intent_phrase = "ຂ້ອຍຕ້ອງການຈອງຫ້ອງ"
-        model_store.booking_intent_embedding = model_store.retriever.encode(
-            booking_intent_phrase,
-            convert_to_tensor=True,
-            device=model_store.device
-        )
+        model_store.booking_intent_embedding = run_retriever(booking_intent_phrase)
+
+        warmup_models()
 
         model_store.models_loaded = True
         logging.info("👍 All models loaded and optimized for mobile GPU.")
@@ -172,95 +308,269 @@ def load_all_models_and_data():
         cleanup_gpu_memory()
         raise
 
-def get_rag_context(query: str) -> str:
-    if not model_store.rag_chunks or model_store.rag_embeddings is None:
-        return "ບໍ່ມີຂໍ້ມູນສະເພາະໃນຄັງຄວາມຮູ້ກ່ຽວກັບວັງວຽງ ແລະ ບໍລິການໂຮງແຮມ."
-
+def warmup_models():
+    """Pay torch.compile, CUDA graph capture and kernel autotune costs at startup instead of on the first request"""
     try:
-        # Use word_tokenize if available, otherwise use query as-is
-        try:
-            tokenized_query = " ".join(word_tokenize(query))
-        except:
-            tokenized_query = query
-            
-        query_embedding = model_store.retriever.encode(
-            tokenized_query,
+        with torch.inference_mode():
+            # The full retrieval path: laonlp, the retriever encode and the similarity GEMV + topk
+            # over the whole knowledge base, so the allocator already holds a scores-sized block
+            warmup_context = get_rag_context("ສະບາຍດີ")
+
+            input_ids = torch.cat([
+                model_store.system_prompt_ids,
+                torch.tensor([build_prompt_suffix_ids("ສະບາຍດີ", warmup_context)], dtype=model_store.system_prompt_ids.dtype, device=model_store.device)
+            ], dim=-1)
+            # Two passes: the first compiles, the second records the CUDA graph
+            for _ in range(2):
+                cache_kwargs = {}
+                if model_store.static_cache is not None:
+                    restore_system_prompt_cache()
+                    cache_kwargs["past_key_values"] = model_store.static_cache
+                model_store.generator_llm.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    **{**get_sampling_kwargs(), "max_new_tokens": 8},
+                    **cache_kwargs
+                )
+
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        logging.info("🔥 Retriever and LLM warmed up.")
+    except Exception as e:
+        logging.warning(f"Model warmup failed, first request will be slower: {e}")
+
+def load_knowledge_base():
+    """Load KB chunks and embeddings, preferring the memory-mapped FP16 .npy export"""
+    # With a FAISS index the matrix is only needed on CPU to build it, so it never takes VRAM
+    kb_device = "cpu" if faiss is not None else model_store.retriever_device
+    kb_dtype = torch.float16 if str(kb_device).startswith('cuda') else torch.float32
+
+    if os.path.exists(CONFIG.KNOWLEDGE_BASE_NPY_PATH) and os.path.exists(CONFIG.KNOWLEDGE_BASE_CHUNKS_PATH):
+        logging.info(f"Loading knowledge base from: {CONFIG.KNOWLEDGE_BASE_NPY_PATH}")
+        with open(CONFIG.KNOWLEDGE_BASE_CHUNKS_PATH, encoding='utf-8') as f:
+            model_store.rag_chunks = json.load(f)
+        # Copy-on-write mmap: pages are read lazily and shared with the OS page cache.
+        # The export is already unit-normalized, so the CPU path needs no pass over it
+        embeddings = torch.from_numpy(np.load(CONFIG.KNOWLEDGE_BASE_NPY_PATH, mmap_mode='c'))
+        if faiss is not None:
+            model_store.rag_embeddings = embeddings
+        else:
+            model_store.rag_embeddings = embeddings.to(kb_device, dtype=kb_dtype, non_blocking=True)
+    else:
+        knowledge_base_path = None
+        for path in [CONFIG.KNOWLEDGE_BASE_PATH, CONFIG.LEGACY_KNOWLEDGE_BASE_PATH]:
+            if os.path.exists(path):
+                knowledge_base_path = path
+                break
+
+        if not knowledge_base_path:
+            logging.warning(f"Knowledge base file not found. RAG will be disabled.")
+            logging.info(f"Searched paths: {CONFIG.KNOWLEDGE_BASE_NPY_PATH}, {CONFIG.KNOWLEDGE_BASE_PATH}, {CONFIG.LEGACY_KNOWLEDGE_BASE_PATH}")
+            return
+
+        logging.info(f"Loading knowledge base from: {knowledge_base_path}")
+        # mmap avoids reading the whole file into RAM before the device copy; FP16 halves GPU memory
+        kb_data = torch.load(knowledge_base_path, map_location='cpu', mmap=True)
+        model_store.rag_chunks = kb_data['chunks']
+        # Unit-normalize once so every similarity below is a plain dot product
+        model_store.rag_embeddings = torch.nn.functional.normalize(
+            kb_data['embeddings'].to(kb_device, dtype=kb_dtype, non_blocking=True), dim=-1
+        )
+
+    logging.info(f"✅ Knowledge base loaded with {len(model_store.rag_chunks)} chunks.")
+    build_rag_index()
+    check_gpu_memory()
+
+def build_rag_index():
+    """Build an HNSW inner-product index over the normalized knowledge base embeddings"""
+    if faiss is None:
+        logging.info("faiss not installed - RAG falls back to an exact normalized matmul + topk over the embeddings.")
+        return
+
+    # Inner product on unit vectors is cosine similarity, so RAG_CONFIDENCE_THRESHOLD keeps its meaning
+    vectors = np.ascontiguousarray(model_store.rag_embeddings.cpu().numpy(), dtype=np.float32)
+    index = faiss.IndexHNSWFlat(vectors.shape[1], CONFIG.RAG_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.add(vectors)
+    model_store.rag_index = index
+    logging.info(f"✅ HNSW index built over {index.ntotal} knowledge base vectors.")
+
+@torch.inference_mode()
+def run_retriever_batch(texts: List[str]) -> torch.Tensor:
+    """Unit-normalized embeddings for several texts in one forward pass, uncached"""
+    if not str(model_store.retriever_device).startswith('cuda'):
+        return model_store.retriever.encode(
+            texts,
+            batch_size=len(texts),
             convert_to_tensor=True,
-            device=model_store.device
+            device=model_store.retriever_device,
+            normalize_embeddings=True
         )
-        hits = util.semantic_search(
-            query_embedding,
-            model_store.rag_embeddings,
-            top_k=CONFIG.RAG_TOP_K
-        )[0]
-
-        if hits and hits[0]['score'] > CONFIG.RAG_CONFIDENCE_THRESHOLD:
-            context = "\n".join([model_store.rag_chunks[hit['corpus_id']] for hit in hits])
-            logging.info(f"Retrieved context with top score: {hits[0]['score']:.4f}")
-            return context
-        return "ບໍ່ມີຂໍ້ມູນສະເພາະກ່ຽວກັບເລື່ອງນີ້ໃນວັງວຽງ, ແຕ່ຂ້ອຍສາມາດໃຫ້ຄຳແນະນຳທົ່ວໄປໄດ້."
+
+    # Padding every query to the same length keeps activation shapes constant on the GPU,
+    # so the caching allocator hands back the same blocks instead of carving new ones
+    features = model_store.retriever.tokenizer(
+        texts,
+        padding='max_length',
+        max_length=CONFIG.QUERY_MAX_TOKENS,
+        truncation=True,
+        return_tensors='pt'
+    ).to(model_store.retriever_device)
+    # The full module runs LaBSE's CLS pooling, dense and normalize layers, same as encode()
+    embeddings = model_store.retriever(dict(features))['sentence_embedding']
+    return torch.nn.functional.normalize(embeddings, dim=-1)
+
+def run_retriever(text: str) -> torch.Tensor:
+    """One unit-normalized query embedding, uncached"""
+    return run_retriever_batch([text])[0]
+
+def encode_queries(tokenized_queries: List[str]) -> List[torch.Tensor]:
+    """Encode tokenized queries, memoized; cache misses share a single forward pass"""
+    embeddings = [cache_service.get_cached_ml_embedding(query) for query in tokenized_queries]
+    missing = list(dict.fromkeys(query for query, embedding in zip(tokenized_queries, embeddings) if embedding is None))
+    if missing:
+        encoded = dict(zip(missing, run_retriever_batch(missing)))
+        for query, embedding in encoded.items():
+            cache_service.cache_ml_embedding(query, embedding)
+        embeddings = [encoded[query] if embedding is None else embedding for query, embedding in zip(tokenized_queries, embeddings)]
+    return embeddings
+
+def encode_query(tokenized_query: str) -> torch.Tensor:
+    """Encode a tokenized query, memoized so intent detection and RAG share one forward pass"""
+    return encode_queries([tokenized_query])[0]
+
+@lru_cache(maxsize=1024)
+def tokenize_query(query: str) -> str:
+    """Lao word segmentation joined by spaces; memoized because intent detection and RAG both need it"""
+    try:
+        return " ".join(word_tokenize(query))
+    except Exception:
+        return query
+
+@torch.inference_mode()
+def get_rag_contexts(queries: List[str]) -> List[str]:
+    """RAG context for several queries: one batched encode, one similarity GEMM/search"""
+    if not model_store.rag_chunks or model_store.rag_embeddings is None:
+        return ["ບໍ່ມີຂໍ້ມູນສະເພາະໃນຄັງຄວາມຮູ້ກ່ຽວກັບວັງວຽງ ແລະ ບໍລິການໂຮງແຮມ."] * len(queries)
+
+    try:
+        query_embeddings = torch.stack(encode_queries([tokenize_query(query) for query in queries]))
+        if model_store.rag_index is not None:
+            query_vectors = query_embeddings.float().cpu().numpy()
+            scores, corpus_ids = model_store.rag_index.search(query_vectors, CONFIG.RAG_TOP_K)
+            scores, corpus_ids = scores.tolist(), corpus_ids.tolist()
+        else:
+            # Corpus rows are unit-normalized, so one GEMM + row-wise topk gives every query's cosine top-k
+            similarities = query_embeddings.to(model_store.rag_embeddings.dtype) @ model_store.rag_embeddings.T
+            top = torch.topk(similarities, min(CONFIG.RAG_TOP_K, similarities.shape[-1]), dim=-1)
+            scores, corpus_ids = top.values.float().cpu().tolist(), top.indices.cpu().tolist()
     except Exception as e:
         logging.error(f"Error in RAG context retrieval: {e}")
-        return "ເກີດຂໍ້ຜິດພາດໃນການຄົ້ນຫາຂໍ້ມູນ."
+        return ["ເກີດຂໍ້ຜິດພາດໃນການຄົ້ນຫາຂໍ້ມູນ."] * len(queries)
+
+    contexts = []
+    for query_scores, query_ids in zip(scores, corpus_ids):
+        if query_ids and query_ids[0] != -1 and query_scores[0] > CONFIG.RAG_CONFIDENCE_THRESHOLD:
+            logging.info(f"Retrieved context with top score: {query_scores[0]:.4f}")
+            contexts.append("\n".join(model_store.rag_chunks[corpus_id] for corpus_id in query_ids if corpus_id != -1))
+        else:
+            contexts.append("ບໍ່ມີຂໍ້ມູນສະເພາະກ່ຽວກັບເລື່ອງນີ້ໃນວັງວຽງ, ແຕ່ຂ້ອຍສາມາດໃຫ້ຄຳແນະນຳທົ່ວໄປໄດ້.")
+    return contexts
 
-def generate_llm_answer_sync(user_query: str, context: str) -> str:
+def get_rag_context(query: str) -> str:
+    return get_rag_contexts([query])[0]
+
+def build_prompt_suffix_ids(user_query: str, context: str) -> List[int]:
+    """Token ids of the per-request part of the prompt that follows the cached system prompt"""
+    tokenizer = model_store.tokenizer
+    fragments = model_store.prompt_fragment_ids
+    # Only the context and the query are tokenized per request; the template ids are cached.
+    # Context is cut by tokens so the prefill length no longer depends on how Lao text tokenizes
+    context_ids = fragments["context"] + tokenizer(
+        " " + context,
+        max_length=max(CONFIG.CONTEXT_MAX_TOKENS - len(fragments["context"]), 1),
+        truncation=True,
+        add_special_tokens=False
+    ).input_ids
+    query_ids = fragments["human"] + tokenizer(" " + user_query, add_special_tokens=False).input_ids
+
+    # Overlong queries lose their head, never the trailing "Assistant: " marker
+    budget = max(CONFIG.MAX_INPUT_LENGTH - model_store.system_prompt_ids.shape[-1] - len(context_ids) - len(fragments["assistant"]), 1)
+    return context_ids + query_ids[-budget:] + fragments["assistant"]
+
+def get_sampling_kwargs() -> dict:
+    """Generation settings shared by the single and batched paths"""
+    return {
+        "max_new_tokens": CONFIG.MAX_NEW_TOKENS,
+        "eos_token_id": model_store.tokenizer.eos_token_id,
+        "do_sample": True,
+        "temperature": CONFIG.TEMPERATURE,
+        "top_p": CONFIG.TOP_P,
+        "repetition_penalty": CONFIG.REPETITION_PENALTY,
+        "use_cache": True,
+        "pad_token_id": model_store.tokenizer.eos_token_id,
+        "stop_strings": CONFIG.STOP_STRINGS,
+        "tokenizer": model_store.tokenizer
+    }
+
+def strip_stop_strings(reply: str) -> str:
+    """Cut a decoded reply at the first stop string the model started writing"""
+    for stop in CONFIG.STOP_STRINGS:
+        reply = reply.split(stop, 1)[0]
+    return reply.strip()
+
+class AsyncTextStreamer(TextStreamer):
+    """Hands decoded text from the generate() thread to an asyncio.Queue; None marks the end"""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+def generate_llm_answer_sync(user_query: str, context: str, streamer: Optional[TextStreamer] = None) -> str:
     """
     OPTIMIZED for mobile GPU - reduced memory usage and faster inference
     """
     try:
-        cleanup_gpu_memory()  # Clean memory before inference
-
-        system_prompt = (
-            "You are Sailor2, an AI assistant for Vang Vieng, Laos tourism and hotel services. "
-            "Respond in Lao language (ພາສາລາວ) with helpful, professional information about:\n"
-            "- Hotel bookings and accommodations\n"
-            "- Tourist attractions in Vang Vieng\n"
-            "- Restaurants and local food\n"
-            "- Transportation and travel tips\n"
-            "- Adventure activities\n"
-            "Keep responses concise and friendly."
-        )
+        system_ids = model_store.system_prompt_ids
 
-        # Shorter prompt for mobile GPU
-        prompt = (
-            f"System: {system_prompt}\n\n"
-            f"Context: {context[:300]}...\n\n"  # Limit context length
-            f"Human: {user_query}\n\n"
-            f"Assistant: "
+        # Only the per-request suffix is tokenized; the system prompt ids are cached at load time
+        suffix_ids = torch.tensor(
+            [build_prompt_suffix_ids(user_query, context)],
+            dtype=system_ids.dtype,
+            device=model_store.device
         )
 
-        inputs = model_store.tokenizer(
-            prompt,
-            return_tensors="pt",
-            max_length=CONFIG.MAX_INPUT_LENGTH,
-            truncation=True,
-            padding=False  # Don't pad to save memory
-        ).to(model_store.device)
+        input_ids = torch.cat([system_ids, suffix_ids], dim=-1)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
 
+        # Reuse the pre-allocated KV cache, seeded with the prefilled system prompt
+        cache_kwargs = {}
+        if model_store.static_cache is not None:
+            restore_system_prompt_cache()
+            cache_kwargs["past_key_values"] = model_store.static_cache
+
+        # No autocast: weights are already FP16/INT4, so it would only add per-op dispatch checks
         with torch.no_grad():
-            with torch.amp.autocast('cuda'):  # Use automatic mixed precision
-                outputs = model_store.generator_llm.generate(
-                    **inputs,
-                    max_new_tokens=CONFIG.MAX_NEW_TOKENS,
-                    eos_token_id=model_store.tokenizer.eos_token_id,
-                    do_sample=True,
-                    temperature=0.7,
-                    top_p=0.9,
-                    repetition_penalty=1.1,
-                    use_cache=False,  # Disable KV cache to save memory
-                    pad_token_id=model_store.tokenizer.eos_token_id
-                )
+            outputs = model_store.generator_llm.generate(
+                **inputs,
+                **get_sampling_kwargs(),
+                **cache_kwargs,
+                streamer=streamer
+            )
 
-        response = model_store.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        # Decode only the generated tokens; the prompt is never detokenized
+        new_tokens = outputs[0, input_ids.shape[-1]:]
+        response = strip_stop_strings(model_store.tokenizer.decode(new_tokens, skip_special_tokens=True))
 
-        # Clean up immediately after generation
-        del inputs, outputs
-        cleanup_gpu_memory()
-
-        try:
-            return response.split("Assistant: ")[-1].strip()
-        except IndexError:
-            return response.strip()
+        del inputs, outputs, new_tokens
+        return response
 
     except torch.cuda.OutOfMemoryError:
         logging.error("GPU OOM during generation. Cleaning memory and falling back.")
@@ -268,5 +578,171 @@ def generate_llm_answer_sync(user_query: str, context: str) -> str:
         return "ຂໍອະໄພ, ລະບົບໝົດຄວາມຈື່ຊົ່ວຄາວ. ກະລຸນາລອງຖາມຄຳຖາມສັ້ນໆ."
     except Exception as e:
         logging.error(f"Error in LLM generation: {e}")
-        cleanup_gpu_memory()
         return "ຂໍອະໄພ, ເກີດຂໍ້ຜິດພາດໃນການຕອບ."
+
+@contextmanager
+def uncompiled_forward():
+    """Run the LLM's eager forward inside the block; the compiled one only suits the batch-1 static cache.
+
+    Safe to swap in place because the generation queue runs one generate() at a time.
+    """
+    module = model_store.compiled_module
+    if module is None:
+        yield
+        return
+    compiled_forward = module.forward
+    module.forward = model_store.eager_forward
+    try:
+        yield
+    finally:
+        module.forward = compiled_forward
+
+def generate_llm_answer_batch(requests: List[Tuple[str, str]]) -> List[str]:
+    """
+    Generate answers for several (user_query, context) pairs in one padded generate() call.
+    A single request keeps the static-cache + prefix-cache fast path.
+    """
+    # The fused AWQ model (no static cache) builds its own causal mask and ignores attention_mask,
+    # so left-padded rows would attend to padding; run its requests one at a time instead
+    if len(requests) == 1 or model_store.static_cache is None:
+        return [generate_llm_answer_sync(user_query, context) for user_query, context in requests]
+
+    try:
+        system_ids = model_store.system_prompt_ids[0].tolist()
+        prompt_ids = [
+            system_ids + build_prompt_suffix_ids(user_query, context)
+            for user_query, context in requests
+        ]
+
+        # Decoder-only models need left padding so every row ends at the generation boundary;
+        # the tokenizer is shared, so its padding side is put back afterwards
+        tokenizer = model_store.tokenizer
+        padding_side, tokenizer.padding_side = tokenizer.padding_side, "left"
+        try:
+            inputs = tokenizer.pad(
+                {"input_ids": prompt_ids},
+                return_tensors="pt",
+                padding=True
+            ).to(model_store.device)
+        finally:
+            tokenizer.padding_side = padding_side
+
+        # Padded batches vary in size and length; under the dynamic=False compile each new shape would recompile
+        with torch.no_grad(), uncompiled_forward():
+            outputs = model_store.generator_llm.generate(**inputs, **get_sampling_kwargs())
+
+        new_tokens = outputs[:, inputs["input_ids"].shape[-1]:]
+        replies = [
+            strip_stop_strings(model_store.tokenizer.decode(row, skip_special_tokens=True))
+            for row in new_tokens
+        ]
+
+        del inputs, outputs, new_tokens
+        return replies
+
+    except torch.cuda.OutOfMemoryError:
+        logging.error(f"GPU OOM during batched generation of {len(requests)} requests. Cleaning memory and falling back.")
+        cleanup_gpu_memory()
+        return ["ຂໍອະໄພ, ລະບົບໝົດຄວາມຈື່ຊົ່ວຄາວ. ກະລຸນາລອງຖາມຄຳຖາມສັ້ນໆ."] * len(requests)
+    except Exception as e:
+        logging.error(f"Error in batched LLM generation: {e}")
+        return ["ຂໍອະໄພ, ເກີດຂໍ້ຜິດພາດໃນການຕອບ."] * len(requests)
+
+class BatchingQueue(ABC):
+    """
+    Collects concurrent requests for a single worker task, which drains them in
+    batches of up to max_batch_size items that arrive within max_wait_ms of each other.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: int):
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.pending: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.pending = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def _enqueue(self, item: tuple):
+        if self.worker is None or self.worker.done():
+            self.start()
+        await self.pending.put(item)
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.pending.get()]
+        deadline = loop.time() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.pending.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @abstractmethod
+    async def _run(self):
+        """Worker loop: drain batches with _collect_batch and resolve each item's future"""
+
+class RetrievalQueue(BatchingQueue):
+    """Coalesces concurrent RAG lookups into one batched retriever forward pass and similarity GEMM"""
+
+    async def submit(self, query: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self._enqueue((query, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                contexts = await asyncio.to_thread(get_rag_contexts, [query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), context in zip(batch, contexts):
+                if not future.done():
+                    future.set_result(context)
+
+class GenerationQueue(BatchingQueue):
+    """Batches up to max_batch_size concurrent prompts into one generate() call"""
+
+    async def submit(self, user_query: str, context: str, streamer: Optional[AsyncTextStreamer] = None) -> str:
+        """Queue a prompt and wait for its reply; a streamer also receives the text as it is decoded"""
+        future = asyncio.get_running_loop().create_future()
+        await self._enqueue((user_query, context, future, streamer))
+        return await future
+
+    async def _resolve(self, items: list, generate_fn, *args):
+        try:
+            replies = await asyncio.to_thread(generate_fn, *args)
+        except Exception as e:
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future, _), reply in zip(items, replies):
+            if not future.done():
+                future.set_result(reply)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            plain = [item for item in batch if item[3] is None]
+            if plain:
+                await self._resolve(plain, generate_llm_answer_batch, [(user_query, context) for user_query, context, _, _ in plain])
+            # Streamed prompts run one at a time so tokens can be pushed as they are decoded
+            for item in batch:
+                user_query, context, _, streamer = item
+                if streamer is not None:
+                    await self._resolve([item], lambda: [generate_llm_answer_sync(user_query, context, streamer)])
+                    streamer.close()
+
+# Global batching queues
+retrieval_queue = RetrievalQueue(CONFIG.RETRIEVAL_BATCH_SIZE, CONFIG.RETRIEVAL_BATCH_WAIT_MS)
+generation_queue = GenerationQueue(CONFIG.BATCH_SIZE, CONFIG.BATCH_WAIT_MS)
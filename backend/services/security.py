@@ -1,4 +1,5 @@
 # services/security.py
+import time
 import hashlib
 import secrets
 import bcrypt
@@ -6,7 +7,11 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
-from config.settings import AuthConfig
+from config.settings import AUTH_CONFIG
+from services.cache import InMemoryCache
+
+# Decoded JWT payloads, so repeat requests with the same bearer token skip the signature check
+TOKEN_CACHE_SIZE = 1024
 
 class SecurityService:
     """Enhanced security service with password hashing, rate limiting, and JWT management"""
@@ -16,6 +21,7 @@ class SecurityService:
         self.blocked_ips = {}
         self.max_attempts = 5
         self.block_duration = 900  # 15 minutes
+        self._token_cache = InMemoryCache(max_size=TOKEN_CACHE_SIZE)
     
     def hash_password(self, password: str) -> str:
         """Hash password using bcrypt"""
@@ -32,23 +38,32 @@ class SecurityService:
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=AuthConfig.ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = datetime.utcnow() + timedelta(minutes=AUTH_CONFIG.ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, AuthConfig.SECRET_KEY, algorithm=AuthConfig.ALGORITHM)
+        encoded_jwt = jwt.encode(to_encode, AUTH_CONFIG.SECRET_KEY, algorithm=AUTH_CONFIG.ALGORITHM)
         return encoded_jwt
     
     def verify_token(self, token: str) -> dict:
         """Verify and decode JWT token"""
-        try:
-            payload = jwt.decode(token, AuthConfig.SECRET_KEY, algorithms=[AuthConfig.ALGORITHM])
+        # Keyed by digest so raw bearer tokens are never held as cache keys
+        token_key = hashlib.sha256(token.encode()).hexdigest()
+        payload = self._token_cache.get(token_key, prefix='jwt')
+        if payload is not None:
             return payload
+        try:
+            payload = jwt.decode(token, AUTH_CONFIG.SECRET_KEY, algorithms=[AUTH_CONFIG.ALGORITHM])
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        # Cached entries must not outlive the token itself
+        ttl = int(payload.get('exp', 0) - time.time())
+        if ttl > 0:
+            self._token_cache.set(token_key, payload, ttl=ttl, prefix='jwt')
+        return payload
     
     def check_rate_limit(self, ip_address: str) -> bool:
         """Check if IP is rate limited"""
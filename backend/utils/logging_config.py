@@ -1,17 +1,26 @@
 # utils/logging_config.py
+import copy
+import queue
+import atexit
 import logging
 import sys
-from datetime import datetime
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 from pathlib import Path
-import json
+from typing import List
+import orjson
+
+# Records waiting for the listener threads; past this, new records are dropped rather than block a request
+LOG_QUEUE_SIZE = 10_000
+
+_listeners: List[QueueListener] = []
 
 class JSONFormatter(logging.Formatter):
     """JSON formatter for structured logging"""
     
     def format(self, record):
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -22,6 +31,8 @@ class JSONFormatter(logging.Formatter):
         
         if record.exc_info:
             log_entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_entry["exception"] = record.exc_text
             
         # Add custom fields if present
         if hasattr(record, 'user_id'):
@@ -31,7 +42,48 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, 'request_id'):
             log_entry["request_id"] = record.request_id
             
-        return json.dumps(log_entry)
+        return orjson.dumps(log_entry, default=str).decode()
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Hands records to a QueueListener thread; formatting and file I/O happen there"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve anything that may not survive the thread hop, but leave formatting
+        # to the real handlers so each keeps its own formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _route_through_queue(logger: logging.Logger):
+    """Move a logger's handlers behind a queue served by a background listener"""
+    # A queue handler left by an earlier setup_logging call points at a stopped listener
+    handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(_NonBlockingQueueHandler(log_queue))
+    listener.start()
+    _listeners.append(listener)
+
+def stop_logging():
+    """Flush queued records to their handlers and stop the listener threads"""
+    while _listeners:
+        _listeners.pop().stop()
 
 def setup_logging(log_level: str = "INFO", enable_json: bool = False):
     """Setup comprehensive logging configuration"""
@@ -44,7 +96,8 @@ def setup_logging(log_level: str = "INFO", enable_json: bool = False):
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, log_level.upper()))
     
-    # Clear existing handlers
+    # Clear existing handlers (and the listeners of an earlier setup_logging call)
+    stop_logging()
     root_logger.handlers.clear()
     
     # Console handler
@@ -131,6 +184,11 @@ def setup_logging(log_level: str = "INFO", enable_json: bool = False):
     security_logger.addHandler(security_handler)
     security_logger.setLevel(logging.WARNING)
     
+    # Request threads only enqueue records; formatting and file writes run on listener threads
+    for logger in (root_logger, chat_logger, perf_logger, security_logger):
+        _route_through_queue(logger)
+    atexit.register(stop_logging)
+    
     logging.info("Logging system initialized")
 
 class PerformanceLogger: